@@ -0,0 +1,63 @@
+import asyncio
+from collections import deque
+import json
+
+# approximate number of bytes of NDJSON read from the stream and decoded per batch
+ASYNC_CHUNK_SIZE = 1 << 16
+
+
+async def from_json_async(cls, reader, chunk_size=ASYNC_CHUNK_SIZE, executor=None, max_pending=2):
+    """
+    Decode newline-delimited JSON records read from an asyncio stream into instances of a generated class
+    The stream is read in chunks of about chunk_size bytes, and the complete lines of each chunk are decoded as one
+    batch. Decoding inline yields to the event loop after every batch; with an executor, batches are decoded in it
+    while the next chunks are read. Chunks are only read as instances are consumed, with at most max_pending batches
+    being decoded ahead, so a slow consumer stops reading and the stream's transport is paused once its buffer fills.
+    :param cls: generated class with a from_json method
+    :param reader: asyncio.StreamReader, or any object with an awaitable read(n) method returning bytes
+    :param chunk_size: approximate number of bytes decoded per batch
+    :param executor: concurrent.futures.Executor to decode batches in, or None to decode them in the event loop; cls
+        must be picklable by reference for a ProcessPoolExecutor, see parallel.from_json_parallel
+    :param max_pending: with an executor, maximum number of batches being decoded at once
+    :return: async generator of decoded instances, in stream order
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+    if max_pending < 1:
+        raise ValueError("max_pending must be positive")
+
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    tail, eof = b'', False
+    while not eof:
+        data = await reader.read(chunk_size)
+        if data:
+            # keep the incomplete last line for the next batch
+            data = tail + data
+            end = data.rfind(b'\n') + 1
+            data, tail = data[:end], data[end:]
+        else:
+            data, eof = tail, True
+
+        if data:
+            if executor is None:
+                for obj in decode_lines(cls, data):
+                    yield obj
+                await asyncio.sleep(0)
+            else:
+                pending.append(loop.run_in_executor(executor, decode_lines, cls, data))
+
+        while pending and (eof or len(pending) >= max_pending):
+            for obj in await pending.popleft():
+                yield obj
+
+
+def decode_lines(cls, data):
+    """
+    Parse and decode the NDJSON records of a batch, run in the event loop or in an executor
+    :param cls: generated class with a from_json method
+    :param data: NDJSON bytes
+    :return: list of decoded instances
+    """
+    from_json, loads = cls.from_json, json.loads
+    return [from_json(loads(line)) for line in data.splitlines() if line.strip()]
@@ -0,0 +1,34 @@
+import copy
+import json
+import os
+
+from unimplemented_type import UnimplementedType
+
+DITTO_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'example', 'ditto.json')
+
+
+def load_ditto(moves=1):
+    """
+    Load the example Ditto payload, optionally scaling up its list of moves
+    :param moves: number of times to repeat the payload's moves
+    :return: Ditto JSON dict
+    """
+    with open(DITTO_PATH, 'r', encoding='utf-8') as f:
+        ditto = json.load(f)
+    ditto['moves'] = [copy.deepcopy(move) for _ in range(moves) for move in ditto['moves']]
+    return ditto
+
+
+def generate_classes(classname, payload, **codegen_options):
+    """
+    Serialize a payload, generate code for it and execute the code
+    :param classname: name of the generated top-level class
+    :param payload: JSON payload to serialize
+    :param codegen_options: keyword arguments forwarded to UnimplementedType.codegen
+    :return: namespace dict of the executed generated module
+    """
+    code = UnimplementedType(classname).serialize_json(payload) \
+        .codegen(include_nested_classes=True, include_from_json_method=True, **codegen_options)
+    namespace = {}
+    exec(compile(code, '<{}>'.format(classname), 'exec'), namespace)
+    return namespace
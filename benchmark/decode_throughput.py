@@ -0,0 +1,44 @@
+"""
+Compare Ditto.from_json decode throughput of the default and optimized generated decoders
+Usage: python -m benchmark.decode_throughput [copies] [moves] [repeat]
+"""
+import sys
+import timeit
+
+from benchmark.common import load_ditto, generate_classes
+
+DECODERS = [
+    ('default', {}),
+    ('optimized', {'optimized': True}),
+]
+
+
+def throughput(decoders, payloads, repeat):
+    """
+    Time decoding a list of payloads with generated Ditto.from_json methods, alternating between decoders on each run
+    so that drift in machine speed affects every decoder alike
+    :param decoders: list of (name, generated module namespace)
+    :param payloads: list of Ditto JSON dicts
+    :param repeat: number of timed runs per decoder, the fastest is kept
+    :return: dict of decoder name to payloads decoded per second
+    """
+    best = {name: float('inf') for name, _ in decoders}
+    for _ in range(repeat):
+        for name, namespace in decoders:
+            from_json = namespace['Ditto'].from_json
+            best[name] = min(best[name], timeit.timeit(lambda: from_json(payloads), number=1))
+    return {name: len(payloads) / seconds for name, seconds in best.items()}
+
+
+if __name__ == '__main__':
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    moves = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 5
+    payloads = [load_ditto(moves) for _ in range(copies)]
+
+    rates = throughput([(name, generate_classes('ditto', payloads[0], **options)) for name, options in DECODERS],
+                       payloads, repeat)
+    baseline = rates[DECODERS[0][0]]
+    print('{:<12}{:>16}{:>12}'.format('decoder', 'payloads/s', 'speedup'))
+    for name, rate in rates.items():
+        print('{:<12}{:>16.0f}{:>12.2f}'.format(name, rate, rate / baseline))
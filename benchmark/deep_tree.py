@@ -0,0 +1,64 @@
+"""
+Compare recursive and iterative generated decoders on deeply nested, tree-shaped payloads
+Usage: python -m benchmark.deep_tree [depth] [repeat] [max_depth]
+"""
+import sys
+import timeit
+
+from unimplemented_type import UnimplementedType
+
+
+def generate_tree(depth):
+    """
+    Generate a comment thread nested depth levels deep
+    :param depth: number of nested replies
+    :return: JSON dict
+    """
+    tree = {'text': 'leaf', 'score': 0, 'replies': []}
+    for i in range(depth):
+        tree = {'text': 'comment-{}'.format(i), 'score': i, 'replies': [tree]}
+    return tree
+
+
+def generate_decoder(tree, iterative):
+    """
+    Serialize a tree and execute the generated classes
+    :param tree: JSON dict
+    :param iterative: whether to generate the iterative decoder
+    :return: generated Comment class
+    """
+    code = UnimplementedType('comment').serialize_json(tree) \
+        .codegen(include_nested_classes=True, include_from_json_method=True, iterative=iterative)
+    namespace = {}
+    exec(compile(code, '<comment>', 'exec'), namespace)
+    return namespace['Comment']
+
+
+def decodes(decoder, tree):
+    """
+    Check whether a decoder can decode a tree
+    :return: True, or the name of the exception raised
+    """
+    try:
+        decoder.from_json(tree)
+        return True
+    except RecursionError as e:
+        return type(e).__name__
+
+
+if __name__ == '__main__':
+    depth = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    repeat = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    max_depth = int(sys.argv[3]) if len(sys.argv) > 3 else 100000
+
+    tree = generate_tree(depth)
+    deep_tree = generate_tree(max_depth)
+    print('{:<12}{:>20}{:>24}'.format('decoder', 'us/decode @{}'.format(depth), 'decodes @{}'.format(max_depth)))
+    for name, iterative in (('recursive', False), ('iterative', True)):
+        decoder = generate_decoder(tree, iterative)
+        seconds = min(timeit.repeat(lambda: decoder.from_json(tree), number=1, repeat=repeat))
+        print('{:<12}{:>20.1f}{:>24}'.format(name, seconds * 1e6, str(decodes(decoder, deep_tree))))
+
+    seconds = min(timeit.repeat(lambda: UnimplementedType('comment').serialize_json(deep_tree).codegen(
+        include_nested_classes=True, include_from_json_method=True), number=1, repeat=3))
+    print('\nserialize_json + codegen @{}: {:.1f} ms'.format(max_depth, seconds * 1000))
@@ -0,0 +1,43 @@
+"""
+Compare memory held by decoded Ditto payloads for the default, __slots__ and frozen tuple class layouts
+Usage: python -m benchmark.memory_slots [copies] [moves]
+"""
+import gc
+import sys
+import tracemalloc
+
+from benchmark.common import load_ditto, generate_classes
+
+LAYOUTS = [
+    ('default', {}),
+    ('slots', {'slots': True}),
+    ('frozen', {'frozen': True}),
+]
+
+
+def measure(namespace, payloads):
+    """
+    Decode payloads and measure the memory retained by the decoded objects
+    :param namespace: generated module namespace
+    :param payloads: list of Ditto JSON dicts
+    :return: (retained bytes, number of objects decoded)
+    """
+    gc.collect()
+    tracemalloc.start()
+    decoded = namespace['Ditto'].from_json(payloads)
+    retained, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return retained, len(decoded)
+
+
+if __name__ == '__main__':
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    moves = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    payloads = [load_ditto(moves) for _ in range(copies)]
+
+    baseline = None
+    print('{:<10}{:>16}{:>12}'.format('layout', 'retained (KiB)', 'relative'))
+    for name, options in LAYOUTS:
+        retained, _ = measure(generate_classes('ditto', payloads[0], **options), payloads)
+        baseline = baseline or retained
+        print('{:<10}{:>16.1f}{:>12.2f}'.format(name, retained / 1024, retained / baseline))
@@ -0,0 +1,53 @@
+"""
+Compare serial decoding of NDJSON Ditto records with parallel.from_json_parallel, returning the decoded instances or
+reducing them in the workers
+Usage: python -m benchmark.parallel_decode [records] [workers] [repeat]
+"""
+import json
+import os
+import sys
+import tempfile
+import timeit
+
+from benchmark.common import load_ditto
+from parallel import from_json_parallel
+from unimplemented_type import UnimplementedType
+
+
+def count_moves(dittos):
+    """
+    Reduce the instances decoded from a range to their total number of moves, run inside a worker process
+    :param dittos: list of decoded Ditto instances
+    :return: number of moves
+    """
+    return sum(len(ditto.moves) for ditto in dittos)
+
+
+if __name__ == '__main__':
+    records = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    workers = int(sys.argv[2]) if len(sys.argv) > 2 else os.cpu_count() or 1
+    repeat = int(sys.argv[3]) if len(sys.argv) > 3 else 3
+
+    ditto = load_ditto()
+    # built classes are importable in forked workers
+    Ditto = UnimplementedType('ditto').serialize_json(ditto).build_classes()['Ditto']
+    line = json.dumps(ditto) + '\n'
+    with tempfile.NamedTemporaryFile('w', suffix='.ndjson', delete=False) as f:
+        f.write(line * records)
+
+    chunk_size = max(1, len(line) * records // (workers * 4))
+    runs = [
+        ('serial', lambda: from_json_parallel(Ditto, f.name, max_workers=1)),
+        ('parallel', lambda: from_json_parallel(Ditto, f.name, max_workers=workers, chunk_size=chunk_size)),
+        ('parallel+consume', lambda: sum(from_json_parallel(Ditto, f.name, max_workers=workers,
+                                                            chunk_size=chunk_size, consume=count_moves))),
+    ]
+    try:
+        print('{:<20}{:>12}{:>12}'.format('decoder', 'seconds', 'speedup'))
+        baseline = None
+        for name, run in runs:
+            seconds = min(timeit.repeat(run, number=1, repeat=repeat))
+            baseline = baseline or seconds
+            print('{:<20}{:>12.3f}{:>12.2f}'.format(name, seconds, baseline / seconds))
+    finally:
+        os.remove(f.name)
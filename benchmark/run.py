@@ -0,0 +1,118 @@
+"""
+Benchmark schema inference, code generation and generated decoding on synthetic payloads
+Usage: python -m benchmark.run [--save] [--compare] [--tolerance 0.25] [--baselines benchmark/baselines.json]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+from benchmark.synthetic import generate_records
+from unimplemented_type import UnimplementedType
+
+BASELINES_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# name, generate_records parameters
+CASES = [
+    ('wide', {'count': 200, 'depth': 1, 'width': 40, 'list_length': 4, 'key_style': 'underscore'}),
+    ('deep', {'count': 50, 'depth': 5, 'width': 7, 'list_length': 3, 'key_style': 'underscore'}),
+    ('long_lists', {'count': 20, 'depth': 2, 'width': 7, 'list_length': 40, 'key_style': 'mixed'}),
+    ('camelcase', {'count': 100, 'depth': 3, 'width': 8, 'list_length': 4, 'key_style': 'camelcase'}),
+]
+
+
+def measure(fn, repeat):
+    """
+    Time a function and record its peak memory allocation
+    :param fn: function without arguments
+    :param repeat: number of timed runs, the fastest is kept
+    :return: (fastest run in seconds, peak traced memory in bytes, result of the last call)
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best, peak, result
+
+
+def run_case(params, repeat):
+    """
+    Benchmark the three stages on one synthetic payload
+    :param params: generate_records parameters
+    :param repeat: number of timed runs per stage
+    :return: dict of stage name to {'seconds', 'mb_per_s', 'peak_kib'}
+    """
+    records = generate_records(**params)
+    size_mb = len(json.dumps(records)) / 1e6
+    results = {}
+
+    seconds, peak, schema = measure(lambda: UnimplementedType('record').serialize_json(records, merge=True), repeat)
+    results['serialize_json'] = (seconds, peak, size_mb)
+
+    seconds, peak, code = measure(lambda: schema.codegen(include_nested_classes=True, include_from_json_method=True),
+                                  repeat)
+    results['codegen'] = (seconds, peak, len(code) / 1e6)
+
+    namespace = {}
+    exec(compile(code, '<record>', 'exec'), namespace)
+    from_json = namespace['Record'].from_json
+    seconds, peak, _ = measure(lambda: from_json(records), repeat)
+    results['from_json'] = (seconds, peak, size_mb)
+
+    return {stage: {'seconds': seconds, 'mb_per_s': size / seconds, 'peak_kib': peak / 1024}
+            for stage, (seconds, peak, size) in results.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs per stage, the fastest is kept')
+    parser.add_argument('--baselines', default=BASELINES_PATH, help='path of the stored baselines')
+    parser.add_argument('--save', action='store_true', help='store the results as the new baselines')
+    parser.add_argument('--compare', action='store_true', help='compare with the stored baselines')
+    parser.add_argument('--tolerance', type=float, default=0.25,
+                        help='relative slowdown or memory growth reported as a regression')
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if args.compare:
+        with open(args.baselines, 'r', encoding='utf-8') as f:
+            baselines = json.load(f)
+
+    results, regressions = {}, []
+    print('{:<12}{:<16}{:>12}{:>12}{:>12}{:>10}'.format('case', 'stage', 'ms', 'MB/s', 'peak KiB', 'vs base'))
+    for name, params in CASES:
+        results[name] = run_case(params, args.repeat)
+        for stage, result in results[name].items():
+            baseline = baselines.get(name, {}).get(stage)
+            relative = ''
+            if baseline is not None:
+                time_ratio = result['seconds'] / baseline['seconds']
+                memory_ratio = result['peak_kib'] / baseline['peak_kib']
+                relative = '{:.2f}x'.format(time_ratio)
+                if time_ratio > 1 + args.tolerance or memory_ratio > 1 + args.tolerance:
+                    regressions.append('{}/{}: {:.2f}x time, {:.2f}x peak memory'.format(
+                        name, stage, time_ratio, memory_ratio))
+            print('{:<12}{:<16}{:>12.2f}{:>12.2f}{:>12.1f}{:>10}'.format(
+                name, stage, result['seconds'] * 1000, result['mb_per_s'], result['peak_kib'], relative))
+
+    if args.save:
+        with open(args.baselines, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+
+    if regressions:
+        print('\nRegressions beyond {:.0%}:'.format(args.tolerance))
+        print('\n'.join(regressions))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,70 @@
+import random
+
+# cycle of value kinds used for the fields of each generated object
+FIELD_KINDS = ['int', 'str', 'object', 'float', 'list', 'bool', 'primitive_list']
+
+
+def field_key(index, depth, key_style):
+    """
+    Name of a generated field
+    :param index: position of the field within its object
+    :param depth: remaining nesting depth of the object
+    :param key_style: 'underscore', 'camelcase' or 'mixed'
+    :return: field key
+    """
+    if key_style == 'mixed':
+        key_style = 'camelcase' if index % 2 else 'underscore'
+    if key_style == 'camelcase':
+        return 'field{}Level{}'.format(index, depth)
+    if key_style == 'underscore':
+        return 'field_{}_level_{}'.format(index, depth)
+    raise ValueError("key_style must be 'underscore', 'camelcase' or 'mixed'")
+
+
+def generate_payload(depth=3, width=8, list_length=4, key_style='underscore', seed=0):
+    """
+    Generate a synthetic JSON object
+    Each object has width fields cycling through ints, strings, nested objects, floats, lists of objects, booleans and
+    lists of ints; nested objects and lists of objects are only generated while depth is positive.
+    :param depth: nesting depth of objects
+    :param width: number of fields per object
+    :param list_length: number of elements of each generated list
+    :param key_style: 'underscore', 'camelcase' or 'mixed' field keys
+    :param seed: seed for the generated values
+    :return: JSON dict
+    """
+    rng = random.Random(seed)
+
+    def generate(depth):
+        obj = {}
+        for i in range(width):
+            kind = FIELD_KINDS[i % len(FIELD_KINDS)]
+            if kind in ('object', 'list') and depth <= 0:
+                kind = 'int'
+            key = field_key(i, depth, key_style)
+            if kind == 'int':
+                obj[key] = rng.randint(0, 1 << 20)
+            elif kind == 'float':
+                obj[key] = rng.random()
+            elif kind == 'str':
+                obj[key] = 'value-{}'.format(rng.randint(0, 1 << 10))
+            elif kind == 'bool':
+                obj[key] = rng.random() < 0.5
+            elif kind == 'primitive_list':
+                obj[key] = [rng.randint(0, 100) for _ in range(list_length)]
+            elif kind == 'object':
+                obj[key] = generate(depth - 1)
+            else:
+                obj[key] = [generate(depth - 1) for _ in range(list_length)]
+        return obj
+
+    return generate(depth)
+
+
+def generate_records(count, depth=3, width=8, list_length=4, key_style='underscore', seed=0):
+    """
+    Generate a list of synthetic JSON objects sharing the same shape
+    :param count: number of records
+    :return: list of JSON dicts, see generate_payload for the other parameters
+    """
+    return [generate_payload(depth, width, list_length, key_style, seed + i) for i in range(count)]
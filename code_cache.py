@@ -0,0 +1,59 @@
+from collections import OrderedDict
+from threading import Lock
+
+
+class CodeCache:
+    """
+    Thread-safe least recently used cache of built classes, evicting the least recently used entry when full
+    """
+    def __init__(self, maxsize=128):
+        """
+        :param maxsize: maximum number of entries
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = Lock()
+
+    def get(self, key):
+        """
+        Look up an entry, marking it as most recently used
+        :param key: hashable key
+        :return: cached value, or None if the key is not cached
+        """
+        with self.lock:
+            value = self.entries.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        """
+        Add an entry, evicting the least recently used entry if the cache is full
+        :param key: hashable key
+        :param value: value to cache, not None
+        :return: value of the evicted entry, or None if no entry was evicted
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            if len(self.entries) > self.maxsize:
+                return self.entries.popitem(last=False)[1]
+            return None
+
+    def clear(self):
+        """
+        Remove every entry and reset the hit and miss counters
+        """
+        with self.lock:
+            self.entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
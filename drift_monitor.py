@@ -0,0 +1,182 @@
+from datetime import datetime
+import random
+from threading import Lock
+
+from unimplemented_type import UnimplementedType, NONE_TYPE
+from union_type import UnionType
+from unknown_type import UnknownType
+
+
+class BoundedCounter:
+    """
+    Counter of at most maxsize keys, approximating the most frequent keys of an unbounded stream (space-saving)
+    When full, a new key replaces the least frequent key and inherits its count, so counts of rare keys may be
+    overestimated but every key counted more often than total / maxsize times is kept.
+    """
+    def __init__(self, maxsize=256):
+        """
+        :param maxsize: maximum number of keys
+        """
+        if maxsize < 1:
+            raise ValueError("maxsize must be positive")
+        self.maxsize = maxsize
+        self.counts = {}
+
+    def add(self, key, count=1):
+        """
+        Count a key
+        :param key: hashable key
+        :param count: amount to add
+        """
+        counts = self.counts
+        if key in counts or len(counts) < self.maxsize:
+            counts[key] = counts.get(key, 0) + count
+            return
+
+        evicted = min(counts, key=counts.get)
+        counts[key] = counts.pop(evicted) + count
+
+    def most_common(self, n=None):
+        """
+        :param n: number of keys to return, defaults to all
+        :return: list of (key, count) pairs, most frequent first
+        """
+        return sorted(self.counts.items(), key=lambda item: item[1], reverse=True)[:n]
+
+    def __len__(self):
+        return len(self.counts)
+
+
+class DriftMonitor:
+    """
+    Check a sample of JSON payloads against a schema, counting new, missing and type-changed fields
+    Sampled payloads are first checked by the schema's compiled validate method; only payloads that fail are walked
+    again to find which fields drifted, so payloads matching the schema cost one validator call.
+    """
+    def __init__(self, schema, sample_rate=0.01, max_fields=256, seed=None):
+        """
+        :param schema: serialized UnimplementedType the payloads are expected to match
+        :param sample_rate: fraction of observed payloads to check
+        :param max_fields: maximum number of distinct field paths counted per kind of drift
+        :param seed: seed for the random sampling
+        """
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("sample_rate must be between 0 and 1")
+        self.schema = schema
+        self.sample_rate = sample_rate
+        classes = schema.build_classes(include_from_json_method=False, include_validate_method=True)
+        # build_classes returns the root class first
+        self.validate = next(iter(classes.values())).validate
+        self.random = random.Random(seed).random
+        self.observed = 0
+        self.checked = 0
+        self.drifted = 0
+        self.new_fields = BoundedCounter(max_fields)
+        self.missing_fields = BoundedCounter(max_fields)
+        self.changed_fields = BoundedCounter(max_fields)
+        self.lock = Lock()
+
+    def observe(self, json):
+        """
+        Count a payload and check it against the schema if it is sampled
+        :param json: parsed JSON payload
+        :return: True if the payload was checked and does not match the schema
+        """
+        self.observed += 1
+        if self.random() >= self.sample_rate:
+            return False
+
+        self.checked += 1
+        if type(json) is list:
+            if all(element is None or self.validate(element) for element in json):
+                return False
+        elif self.validate(json):
+            return False
+
+        with self.lock:
+            self.drifted += 1
+            self.record_drift(json)
+        return True
+
+    def record_drift(self, json):
+        """
+        Walk a payload that failed validation alongside the schema, counting each drifted field path once
+        Paths use the syntax of UnimplementedType.project, e.g. 'moves[].move.name'.
+        :param json: parsed JSON payload
+        """
+        new, missing, changed = set(), set(), set()
+        # stack of (schema node, JSON value, path prefix) to compare
+        stack = [(self.schema, json, '')]
+        while stack:
+            node, value, prefix = stack.pop()
+            if type(value) is list:
+                stack.extend((node, element, prefix) for element in value)
+                continue
+            if type(value) is not dict:
+                if value is not None:
+                    changed.add(prefix.rstrip('.') or '$')
+                continue
+
+            optional = node.optional_fields()
+            for fieldname in value:
+                if fieldname not in node.nested_classes:
+                    new.add(prefix + fieldname)
+
+            for fieldname, dtype in node.nested_classes.items():
+                path = prefix + fieldname
+                field = value.get(fieldname)
+                if field is None:
+                    if fieldname not in optional:
+                        missing.add(path)
+                    continue
+
+                if not DriftMonitor.matches(dtype, field):
+                    changed.add(path)
+                    continue
+
+                nested = UnimplementedType.structured_member(dtype, UnimplementedType)
+                if type(field) is dict and nested is not None:
+                    stack.append((nested, field, path + '.'))
+                    continue
+                elements = UnimplementedType.structured_member(dtype, list)
+                if type(field) is list and elements and type(elements[0]) is UnimplementedType:
+                    stack.extend((elements[0], element, path + '[].') for element in field)
+
+        for counter, paths in ((self.new_fields, new), (self.missing_fields, missing), (self.changed_fields, changed)):
+            for path in paths:
+                counter.add(path)
+
+    @staticmethod
+    def matches(dtype, value):
+        """
+        Whether a non-null JSON value has one of the datatypes observed for a field
+        :param dtype: datatype
+        :param value: JSON value
+        :return: bool
+        """
+        for member in (dtype.members if type(dtype) is UnionType else (dtype,)):
+            if type(member) is UnknownType or member is NONE_TYPE:
+                return True
+            if type(member) is UnimplementedType:
+                if type(value) is dict:
+                    return True
+            elif type(member) is list:
+                if type(value) is list:
+                    return True
+            elif type(value) is member or (member is datetime and type(value) is str):
+                return True
+        return False
+
+    def report(self):
+        """
+        :return: dict of observed, checked and drifted payload counts, and most common drifted field paths by kind
+        """
+        with self.lock:
+            return {
+                'observed': self.observed,
+                'checked': self.checked,
+                'drifted': self.drifted,
+                'new_fields': self.new_fields.most_common(),
+                'missing_fields': self.missing_fields.most_common(),
+                'changed_fields': self.changed_fields.most_common(),
+            }
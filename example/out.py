@@ -27,41 +27,41 @@ class Ditto:
 			return [Ditto.from_json(ditto) for ditto in json]
 
 		try:
-			abilities = [Abilities.from_json(_abilities) for _abilities in json.get('abilities')]
+			_abilities = [Abilities.from_json(item) for item in json.get('abilities')]
 		except TypeError:
-			abilities = []
+			_abilities = []
 
 		try:
-			forms = [Forms.from_json(_forms) for _forms in json.get('forms')]
+			_forms = [Forms.from_json(item) for item in json.get('forms')]
 		except TypeError:
-			forms = []
+			_forms = []
 
 		try:
-			game_indices = [GameIndices.from_json(_game_indices) for _game_indices in json.get('gameIndices')]
+			_game_indices = [GameIndices.from_json(item) for item in json.get('game_indices')]
 		except TypeError:
-			game_indices = []
+			_game_indices = []
 
 		try:
-			held_items = [HeldItems.from_json(_held_items) for _held_items in json.get('heldItems')]
+			_held_items = [HeldItems.from_json(item) for item in json.get('held_items')]
 		except TypeError:
-			held_items = []
+			_held_items = []
 
 		try:
-			moves = [Moves.from_json(_moves) for _moves in json.get('moves')]
+			_moves = [Moves.from_json(item) for item in json.get('moves')]
 		except TypeError:
-			moves = []
+			_moves = []
 
 		try:
-			stats = [Stats.from_json(_stats) for _stats in json.get('stats')]
+			_stats = [Stats.from_json(item) for item in json.get('stats')]
 		except TypeError:
-			stats = []
+			_stats = []
 
 		try:
-			types = [Types.from_json(_types) for _types in json.get('types')]
+			_types = [Types.from_json(item) for item in json.get('types')]
 		except TypeError:
-			types = []
+			_types = []
 
-		return Ditto(abilities, json.get('base_experience'), forms, game_indices, json.get('height'), held_items, json.get('id'), json.get('is_default'), json.get('location_area_encounters'), moves, json.get('name'), json.get('order'), Species.from_json(json.get('species')), Sprites.from_json(json.get('sprites')), stats, types, json.get('weight'))
+		return Ditto(_abilities, json.get('base_experience'), _forms, _game_indices, json.get('height'), _held_items, json.get('id'), json.get('is_default'), json.get('location_area_encounters'), _moves, json.get('name'), json.get('order'), Species.from_json(json.get('species')), Sprites.from_json(json.get('sprites')), _stats, _types, json.get('weight'))
 
 
 class Abilities:
@@ -159,11 +159,11 @@ class HeldItems:
 			return [HeldItems.from_json(heldItems) for heldItems in json]
 
 		try:
-			version_details = [VersionDetails.from_json(_version_details) for _version_details in json.get('versionDetails')]
+			_version_details = [VersionDetails.from_json(item) for item in json.get('version_details')]
 		except TypeError:
-			version_details = []
+			_version_details = []
 
-		return HeldItems(Item.from_json(json.get('item')), version_details)
+		return HeldItems(Item.from_json(json.get('item')), _version_details)
 
 
 class Item:
@@ -212,11 +212,11 @@ class Moves:
 			return [Moves.from_json(moves) for moves in json]
 
 		try:
-			version_group_details = [VersionGroupDetails.from_json(_version_group_details) for _version_group_details in json.get('versionGroupDetails')]
+			_version_group_details = [VersionGroupDetails.from_json(item) for item in json.get('version_group_details')]
 		except TypeError:
-			version_group_details = []
+			_version_group_details = []
 
-		return Moves(Move.from_json(json.get('move')), version_group_details)
+		return Moves(Move.from_json(json.get('move')), _version_group_details)
 
 
 class Move:
@@ -249,7 +249,7 @@ class VersionGroupDetails:
 		if type(json) is list:
 			return [VersionGroupDetails.from_json(versionGroupDetails) for versionGroupDetails in json]
 
-		return VersionGroupDetails(json.get('level_learned_at'), MoveLearnMethod.from_json(json.get('moveLearnMethod')), VersionGroup.from_json(json.get('versionGroup')))
+		return VersionGroupDetails(json.get('level_learned_at'), MoveLearnMethod.from_json(json.get('move_learn_method')), VersionGroup.from_json(json.get('version_group')))
 
 
 class MoveLearnMethod:
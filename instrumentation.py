@@ -0,0 +1,59 @@
+from collections import defaultdict
+from time import perf_counter
+
+
+class Instrumentation:
+    """
+    Counts and timings recorded while inferring schemas and generating code, enabled by assigning an instance to
+    UnimplementedType.instrumentation
+    """
+    def __init__(self):
+        # number of JSON objects folded into schemas and number of classes generated
+        self.nodes_visited = 0
+        self.classes_emitted = 0
+        # seconds spent per classname folding JSON objects (excluding nested objects) and generating code
+        self.inference_time = defaultdict(float)
+        self.codegen_time = defaultdict(float)
+
+    def record_node(self, classname, start):
+        """
+        Record a JSON object folded into a schema
+        :param classname: classname of the schema node the object was folded into
+        :param start: perf_counter value when folding started
+        """
+        self.nodes_visited += 1
+        self.inference_time[classname] += perf_counter() - start
+
+    def timed_class(self, classname, chunks):
+        """
+        Time the generation of a class, counting only the time spent producing its chunks and not consuming them
+        :param classname: classname of the generated class
+        :param chunks: iterator of string chunks of the class's code
+        :return: generator of the same chunks
+        """
+        chunks = iter(chunks)
+        while True:
+            start = perf_counter()
+            chunk = next(chunks, None)
+            self.codegen_time[classname] += perf_counter() - start
+            if chunk is None:
+                break
+            yield chunk
+        self.classes_emitted += 1
+
+    def reset(self):
+        """
+        Reset every count and timing
+        """
+        self.__init__()
+
+    def report(self):
+        """
+        :return: dict of counts and of timings per classname, slowest first
+        """
+        return {
+            'nodes_visited': self.nodes_visited,
+            'classes_emitted': self.classes_emitted,
+            'inference_time': dict(sorted(self.inference_time.items(), key=lambda item: -item[1])),
+            'codegen_time': dict(sorted(self.codegen_time.items(), key=lambda item: -item[1])),
+        }
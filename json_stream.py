@@ -0,0 +1,147 @@
+import codecs
+import json
+from contextlib import contextmanager
+
+WHITESPACE = ' \t\n\r'
+
+
+@contextmanager
+def open_source(source):
+    """
+    Open a JSON source for reading
+    :param source: path to a file or a file-like object opened in text or binary mode
+    :return: context manager yielding a file-like object, closing it on exit only if it was opened here
+    """
+    if hasattr(source, 'read'):
+        yield source
+        return
+
+    with open(source, 'r', encoding='utf-8') as f:
+        yield f
+
+
+def iter_ndjson(source):
+    """
+    Lazily parse newline-delimited JSON, one document per non-blank line
+    :param source: path to a file or a file-like object
+    :return: generator of parsed JSON documents
+    """
+    with open_source(source) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def iter_json_array(source, chunk_size=1 << 16):
+    """
+    Lazily parse the elements of a top-level JSON array, reading the source in chunks
+    Only the element currently being decoded is held in memory; a top-level value that is not an array is yielded as
+    a single element.
+    :param source: path to a file or a file-like object
+    :param chunk_size: number of characters to read from the source at a time
+    :return: generator of parsed array elements
+    """
+    decoder = json.JSONDecoder()
+    with open_source(source) as f:
+        chunks = iter_text_chunks(f, chunk_size)
+        buffer, idx, eof = '', 0, False
+
+        def fill(buffer, idx, size):
+            """
+            Append at least size characters to the unconsumed part of the buffer
+            :return: (buffer, idx, eof)
+            """
+            parts = [buffer[idx:]]
+            read = 0
+            for chunk in chunks:
+                parts.append(chunk)
+                read += len(chunk)
+                if read >= size:
+                    return ''.join(parts), 0, False
+            return ''.join(parts), 0, True
+
+        def skip(buffer, idx, eof):
+            """
+            Skip whitespace, reading more of the source as needed
+            :return: (buffer, idx, eof)
+            """
+            while True:
+                while idx < len(buffer) and buffer[idx] in WHITESPACE:
+                    idx += 1
+                if idx < len(buffer) or eof:
+                    return buffer, idx, eof
+                buffer, idx, eof = fill(buffer, idx, chunk_size)
+
+        buffer, idx, eof = skip(buffer, idx, eof)
+        if idx == len(buffer):
+            return
+
+        if buffer[idx] != '[':
+            # top-level value is not an array, decode it whole
+            while not eof:
+                buffer, idx, eof = fill(buffer, idx, chunk_size)
+            yield decoder.raw_decode(buffer, idx)[0]
+            return
+
+        idx += 1
+        size = chunk_size
+        first = True
+        while True:
+            buffer, idx, eof = skip(buffer, idx, eof)
+            if idx == len(buffer):
+                raise ValueError("Unterminated JSON array")
+            if first and buffer[idx] == ']':
+                return
+            if buffer[idx] in ',]':
+                raise ValueError("Expected a JSON array element, found {!r}".format(buffer[idx]))
+
+            try:
+                element, end = decoder.raw_decode(buffer, idx)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                end = None
+
+            # a value ending exactly at the end of the buffer (e.g. a number) may continue in the next chunk
+            if end is None or (end == len(buffer) and not eof):
+                # grow reads geometrically so that very large elements are not re-parsed a quadratic number of times
+                buffer, idx, eof = fill(buffer, idx, size)
+                size *= 2
+                continue
+
+            size = chunk_size
+            idx, first = end, False
+            yield element
+
+            # elements are separated by exactly one comma
+            buffer, idx, eof = skip(buffer, idx, eof)
+            if idx == len(buffer):
+                raise ValueError("Unterminated JSON array")
+            if buffer[idx] == ']':
+                return
+            if buffer[idx] != ',':
+                raise ValueError("Expected ',' or ']' after a JSON array element, found {!r}".format(buffer[idx]))
+            idx += 1
+
+
+def iter_text_chunks(f, chunk_size):
+    """
+    Read a file-like object in chunks of text, decoding UTF-8 incrementally for binary files
+    :param f: file-like object
+    :param chunk_size: number of characters or bytes to read at a time
+    :return: generator of str chunks
+    """
+    decoder = None
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            if decoder is not None:
+                tail = decoder.decode(b'', final=True)
+                if tail:
+                    yield tail
+            return
+        if type(chunk) is bytes:
+            if decoder is None:
+                decoder = codecs.getincrementaldecoder('utf-8')()
+            chunk = decoder.decode(chunk)
+        yield chunk
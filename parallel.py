@@ -0,0 +1,162 @@
+from concurrent.futures import ProcessPoolExecutor
+from functools import reduce
+import json
+import os
+
+from unimplemented_type import UnimplementedType
+
+# number of shards created per worker, so that uneven file sizes still balance across the pool
+SHARDS_PER_WORKER = 4
+# approximate number of bytes of NDJSON decoded per task by from_json_parallel
+DECODE_CHUNK_SIZE = 1 << 22
+
+
+def serialize_files(classname, paths, format='json', style='underscore', merge=True, sample_size=None, seed=None,
+                    detect_formats=False, track_values=False, max_workers=None):
+    """
+    Serialize many JSON files into a single UnimplementedType using a process pool
+    Files are split into contiguous shards, each shard is serialized into a partial schema by a worker process and the
+    partial schemas are combined with UnimplementedType.merge in file order. The file at index i of paths is sampled
+    with seed + i whichever shard it falls in, so the result does not depend on the number of workers.
+    :param classname: name of the resulting unimplemented class
+    :param paths: iterable of file paths
+    :param format: 'json' for one JSON document per file, or 'ndjson'/'array' to stream each file's records
+    :param style: 'underscore' or 'camelcase' formatting for field names
+    :param merge: when True, fold every list element and record into the schema instead of only the first
+    :param sample_size: when merging, maximum number of elements of each list (and records of each file) to fold
+    :param seed: seed for the random sampling; each file derives its own seed from it and its index
+    :param detect_formats: when True, strings holding ISO 8601 timestamps are recorded as datetime
+    :param track_values: when True, the distinct values of string fields are tracked, see UnimplementedType.serialize_json
+    :param max_workers: number of worker processes, defaults to the number of CPUs; 1 serializes in-process
+    :return: UnimplementedType object containing schema information from all files
+    """
+    paths = list(paths)
+    if not paths:
+        raise ValueError("No files to serialize")
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    nshards = min(len(paths), max_workers * SHARDS_PER_WORKER)
+    bounds = [len(paths) * i // nshards for i in range(nshards + 1)]
+    shards = [(classname, paths[start:end], format, style, merge, sample_size, None if seed is None else seed + start,
+               detect_formats, track_values)
+              for start, end in zip(bounds, bounds[1:])]
+
+    if max_workers == 1:
+        partials = map(serialize_shard, shards)
+        return reduce(UnimplementedType.merge, partials)
+
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return reduce(UnimplementedType.merge, executor.map(serialize_shard, shards))
+
+
+def serialize_shard(shard):
+    """
+    Serialize a shard of files into a partial schema, run inside a worker process
+    :param shard: tuple of (classname, paths, format, style, merge, sample_size, seed, detect_formats, track_values),
+        seed being the seed of the shard's first file, incremented for each following file
+    :return: UnimplementedType object containing schema information from the shard's files
+    """
+    classname, paths, format, style, merge, sample_size, seed, detect_formats, track_values = shard
+    schema = UnimplementedType(classname, style=style)
+    for i, path in enumerate(paths):
+        file_seed = None if seed is None else seed + i
+        if format == 'json':
+            with open(path, 'r', encoding='utf-8') as f:
+                schema.serialize_json(json.load(f), merge=merge, sample_size=sample_size, seed=file_seed,
+                                      detect_formats=detect_formats, track_values=track_values)
+        else:
+            schema.serialize_stream(path, format=format, merge=merge, sample_size=sample_size, seed=file_seed,
+                                    detect_formats=detect_formats, track_values=track_values)
+    return schema
+
+
+def from_json_parallel(cls, source, max_workers=None, chunk_size=DECODE_CHUNK_SIZE, consume=None):
+    """
+    Decode newline-delimited JSON records into instances of a generated class using a process pool
+    The input is split into byte ranges ending at line boundaries. Workers are sent only the file path and range, or
+    the raw bytes of the range, and parse and decode the records themselves, so no parsed JSON is pickled.
+    cls is sent to workers by reference, so it must be importable in them: a class from a generated module, or from
+    UnimplementedType.build_classes when worker processes are forked.
+    Decoded instances are pickled back to the parent process, where unpickling them costs about as much as decoding
+    them serially, so returning instances cannot be faster than a serial decode. Pass consume to reduce each range to
+    a small result in the worker instead, so that only those results are sent back.
+    :param cls: generated class with a from_json method
+    :param source: path to an NDJSON file, or NDJSON bytes
+    :param max_workers: number of worker processes, defaults to the number of CPUs; 1 decodes in-process
+    :param chunk_size: approximate number of bytes decoded per task
+    :param consume: optional function called in the worker with the list of instances decoded from each range; it
+        must be importable in the workers, like cls
+    :return: list of decoded instances in input order, or with consume, list of its results for each range in input
+        order
+    """
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be positive")
+
+    if type(source) is bytes:
+        tasks = [(cls, source[start:end], 0, end - start, consume) for start, end in line_ranges(source, chunk_size)]
+    else:
+        with open(source, 'rb') as f:
+            tasks = [(cls, source, start, end, consume) for start, end in line_ranges(f, chunk_size)]
+
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+
+    if max_workers == 1 or len(tasks) <= 1:
+        chunks = map(decode_range, tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            chunks = list(executor.map(decode_range, tasks))
+
+    if consume is not None:
+        return list(chunks)
+    return [obj for chunk in chunks for obj in chunk]
+
+
+def line_ranges(source, chunk_size):
+    """
+    Split NDJSON into consecutive byte ranges of about chunk_size bytes, each ending after a newline or at the end
+    :param source: NDJSON bytes, or binary file object
+    :param chunk_size: approximate number of bytes per range
+    :return: list of (start, end) byte offsets
+    """
+    if type(source) is bytes:
+        size = len(source)
+    else:
+        size = source.seek(0, os.SEEK_END)
+
+    ranges, start = [], 0
+    while start < size:
+        end = start + chunk_size
+        if end >= size:
+            end = size
+        elif type(source) is bytes:
+            newline = source.find(b'\n', end - 1)
+            end = size if newline == -1 else newline + 1
+        else:
+            source.seek(end - 1)
+            source.readline()
+            end = source.tell()
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+
+def decode_range(task):
+    """
+    Parse and decode the NDJSON records of a byte range, run inside a worker process
+    :param task: tuple of (cls, path or bytes, start, end, consume function or None)
+    :return: list of decoded instances, or the result of consume for them
+    """
+    cls, source, start, end, consume = task
+    if type(source) is bytes:
+        data = source[start:end]
+    else:
+        with open(source, 'rb') as f:
+            f.seek(start)
+            data = f.read(end - start)
+
+    from_json, loads = cls.from_json, json.loads
+    instances = [from_json(loads(line)) for line in data.splitlines() if line.strip()]
+    return instances if consume is None else consume(instances)
@@ -0,0 +1,290 @@
+from datetime import datetime
+import hashlib
+import json
+import os
+
+from unimplemented_type import UnimplementedType, NONE_TYPE
+from union_type import UnionType
+from unknown_type import UnknownType
+
+# primitive datatypes that can be persisted, by name
+PRIMITIVE_TYPES = {dtype.__name__: dtype for dtype in (bool, int, float, str, datetime, NONE_TYPE)}
+
+STORE_VERSION = 1
+
+
+def dtype_to_json(dtype, nodes, queue):
+    """
+    Convert a datatype to a JSON-serializable value, numbering custom classes as they are encountered
+    :param dtype: datatype
+    :param nodes: dict of node id to index in the flattened node table
+    :param queue: list to which newly numbered UnimplementedTypes are appended
+    :return: JSON value
+    """
+    if type(dtype) is UnimplementedType:
+        if id(dtype) not in nodes:
+            nodes[id(dtype)] = len(nodes)
+            queue.append(dtype)
+        return {'class': nodes[id(dtype)]}
+    if type(dtype) is list:
+        return {'list': dtype_to_json(dtype[0], nodes, queue) if dtype else None}
+    if type(dtype) is UnionType:
+        return {'union': [dtype_to_json(member, nodes, queue) for member in dtype.members]}
+    if type(dtype) is UnknownType:
+        return 'unknown'
+    if dtype.__name__ not in PRIMITIVE_TYPES:
+        raise TypeError("Cannot persist datatype {}".format(dtype))
+    return dtype.__name__
+
+
+def dtype_from_json(value, nodes):
+    """
+    Convert a JSON value produced by dtype_to_json back to a datatype
+    :param value: JSON value
+    :param nodes: list of UnimplementedTypes in flattened node table order
+    :return: datatype
+    """
+    if type(value) is str:
+        return UnknownType() if value == 'unknown' else PRIMITIVE_TYPES[value]
+    if 'class' in value:
+        return nodes[value['class']]
+    if 'list' in value:
+        return [] if value['list'] is None else [dtype_from_json(value['list'], nodes)]
+    return UnionType(dtype_from_json(member, nodes) for member in value['union'])
+
+
+def schema_to_json(schema):
+    """
+    Convert an UnimplementedType schema tree to a JSON-serializable dict
+    The tree is flattened into a table of nodes referencing each other by index, so that deep schemas do not hit
+    recursion limits when written as JSON.
+    :param schema: UnimplementedType
+    :return: dict with a 'nodes' list whose first element is the root
+    """
+    nodes, queue, table = {id(schema): 0}, [schema], []
+    for node in queue:
+        table.append({
+            'classname': node.classname,
+            'style': node.style,
+            'is_serialized': node.is_serialized,
+            'sample_count': node.sample_count,
+            'field_counts': node.field_counts,
+            'field_values': {field: None if values is None else sorted(values)
+                             for field, values in node.field_values.items()},
+            'fields': [[fieldname, dtype_to_json(dtype, nodes, queue)]
+                       for fieldname, dtype in node.nested_classes.items()],
+        })
+    return {'nodes': table}
+
+
+def schema_from_json(data):
+    """
+    Convert a dict produced by schema_to_json back to an UnimplementedType schema tree
+    :param data: dict with a 'nodes' list
+    :return: root UnimplementedType
+    """
+    nodes = [UnimplementedType(entry['classname'], style=entry['style']) for entry in data['nodes']]
+    for node, entry in zip(nodes, data['nodes']):
+        node.is_serialized = entry['is_serialized']
+        node.sample_count = entry['sample_count']
+        node.field_counts = entry['field_counts']
+        # stores written before values were tracked have no field_values
+        node.field_values = {field: None if values is None else set(values)
+                             for field, values in entry.get('field_values', {}).items()}
+        node.nested_classes = {fieldname: dtype_from_json(value, nodes) for fieldname, value in entry['fields']}
+    return nodes[0]
+
+
+def local_signature(dtype):
+    """
+    Signature of a datatype as referenced from the class declaring it, naming nested custom classes instead of
+    describing their shape
+    :param dtype: datatype
+    :return: signature string
+    """
+    if type(dtype) is UnimplementedType:
+        return 'class:' + dtype.classname
+    if type(dtype) is list:
+        return '[{}]'.format(local_signature(dtype[0]) if dtype else '')
+    if type(dtype) is UnionType:
+        return 'union({})'.format('|'.join(local_signature(member) for member in dtype.members))
+    if type(dtype) is UnknownType:
+        return 'unknown'
+    return dtype.__name__
+
+
+def class_hash(node, include_from_json_method, codegen_options):
+    """
+    Hash of everything the code generated for a single class depends on
+    Unlike UnimplementedType.fingerprint it does not depend on the shape of nested classes, only on their resolved
+    classnames and, with optimized, on the fields of the classes directly nested in it, so a change deep in a schema
+    only invalidates the classes that changed and those constructing them in place.
+    :param node: UnimplementedType with resolved classnames
+    :param include_from_json_method: whether classes have from_json methods
+    :param codegen_options: keyword arguments of UnimplementedType.codegen
+    :return: hex digest
+    """
+    parts = [node.classname, node.style, str(include_from_json_method), json.dumps(codegen_options, sort_keys=True),
+             ','.join(sorted(node.optional_fields()))]
+    if codegen_options.get('low_cardinality'):
+        parts.append(json.dumps(node.low_cardinality_values(), sort_keys=True))
+    parts.extend(repr(fieldname) + ':' + local_signature(dtype) for fieldname, dtype in node.nested_classes.items())
+    if codegen_options.get('optimized'):
+        # optimized decoders may construct nested classes in place from their fields
+        for dtype in node.nested_classes.values():
+            for nested in UnimplementedType.nested_nodes(dtype):
+                fields = ','.join(repr(fieldname) + ':' + local_signature(field)
+                                  for fieldname, field in nested.nested_classes.items())
+                parts.append('{}({})'.format(nested.classname, fields))
+    return hashlib.sha1('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+class SchemaStore:
+    """
+    Schema persisted on disk together with the code generated for each of its classes, so that merging new samples
+    only regenerates the classes whose schema changed
+    """
+    def __init__(self, path):
+        """
+        :param path: path of the JSON store file, loaded if it exists
+        """
+        self.path = path
+        self.schema = None
+        # classname to (class hash, generated code) of the last codegen
+        self.classes = {}
+        if os.path.exists(path):
+            self.load()
+
+    def load(self):
+        """
+        Load the schema and generated class code from the store file
+        :return: self
+        """
+        with open(self.path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != STORE_VERSION:
+            raise ValueError("Unsupported schema store version {}".format(data.get('version')))
+
+        self.schema = schema_from_json(data['schema']) if data['schema'] is not None else None
+        self.classes = {classname: (digest, code) for classname, digest, code in data['classes']}
+        return self
+
+    def save(self):
+        """
+        Write the schema and generated class code to the store file
+        :return: self
+        """
+        data = {
+            'version': STORE_VERSION,
+            'schema': schema_to_json(self.schema) if self.schema is not None else None,
+            'classes': [[classname, digest, code] for classname, (digest, code) in self.classes.items()],
+        }
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+        return self
+
+    def merge(self, schema):
+        """
+        Merge a newly inferred schema into the stored one
+        :param schema: UnimplementedType
+        :return: merged schema
+        """
+        if self.schema is None:
+            self.schema = schema
+        else:
+            self.schema.merge(schema)
+        return self.schema
+
+    def serialize_json(self, json, classname=None, style='underscore', **serialize_options):
+        """
+        Serialize a new sample and merge it into the stored schema
+        :param json: dict-like JSON object
+        :param classname: name of the root class, defaults to the stored schema's
+        :param style: field name style used when the store is empty
+        :param serialize_options: keyword arguments forwarded to UnimplementedType.serialize_json
+        :return: merged schema
+        """
+        if self.schema is not None:
+            classname, style = classname or self.schema.classname, self.schema.style
+        if classname is None:
+            raise ValueError("A classname is required for an empty schema store")
+
+        schema = UnimplementedType(classname, style=style).serialize_json(json, **serialize_options)
+        if type(schema) is not UnimplementedType:
+            raise ValueError("Sample does not contain any JSON object")
+        return self.merge(schema)
+
+    def codegen(self, output_path=None, include_from_json_method=False, deduplicate_shapes=False, **codegen_options):
+        """
+        Generate the module for the stored schema, reusing the stored code of every class whose hash is unchanged
+        The output file is only rewritten if its content changed, so import caches of unchanged modules stay valid.
+        :param output_path: optional path of the generated module
+        :param include_from_json_method: when True, will add from_json methods to generated code
+        :param deduplicate_shapes: see UnimplementedType.codegen
+        :param codegen_options: further keyword arguments forwarded to UnimplementedType.codegen
+        :return: (generated module code, list of regenerated classnames)
+        """
+        classes = self.resolve_classnames(deduplicate_shapes)
+        regenerated = self.codegen_classes(classes, include_from_json_method, codegen_options)
+        module = UnimplementedType.codegen_header(include_from_json_method, **codegen_options) \
+            + ''.join(code for _, code in self.classes.values())
+
+        if output_path is not None:
+            UnimplementedType.write_if_changed(output_path, module)
+        return module, regenerated
+
+    def write_package(self, path, include_from_json_method=False, deduplicate_shapes=False, **codegen_options):
+        """
+        Write the stored schema as a package with one submodule per class, reusing the stored code of every class
+        whose hash is unchanged, see UnimplementedType.write_package
+        Only submodules whose content changed are rewritten, so unchanged classes keep their cached bytecode.
+        :param path: package directory, created if it does not exist
+        :param include_from_json_method: when True, will add from_json methods to generated code
+        :param deduplicate_shapes: see UnimplementedType.codegen
+        :param codegen_options: further keyword arguments forwarded to UnimplementedType.codegen
+        :return: (list of filenames written, list of regenerated classnames)
+        """
+        classes = self.resolve_classnames(deduplicate_shapes)
+        regenerated = self.codegen_classes(classes, include_from_json_method, codegen_options)
+        header = UnimplementedType.codegen_header(include_from_json_method, **codegen_options)
+        files = UnimplementedType.package_files(classes, 1, header, lambda node: self.classes[node.classname][1])
+
+        os.makedirs(path, exist_ok=True)
+        written = [filename for filename, content in files.items()
+                   if UnimplementedType.write_if_changed(os.path.join(path, filename), content)]
+        return written, regenerated
+
+    def resolve_classnames(self, deduplicate_shapes):
+        """
+        :param deduplicate_shapes: see UnimplementedType.codegen
+        :return: classes of the stored schema to generate, see UnimplementedType.resolve_classnames
+        """
+        if self.schema is None:
+            raise ValueError("The schema store is empty")
+        return self.schema.resolve_classnames(deduplicate_shapes)
+
+    def codegen_classes(self, classes, include_from_json_method, codegen_options):
+        """
+        Generate the code of every class whose hash changed and keep the stored code of the others
+        :param classes: classes to generate, see UnimplementedType.resolve_classnames
+        :param include_from_json_method: when True, will add from_json methods to generated code
+        :param codegen_options: dict of keyword arguments forwarded to UnimplementedType.codegen
+        :return: list of regenerated classnames
+        """
+        generated, regenerated = {}, []
+        for node in classes:
+            digest = class_hash(node, include_from_json_method, codegen_options)
+            cached = self.classes.get(node.classname)
+            if cached is not None and cached[0] == digest:
+                generated[node.classname] = cached
+                continue
+
+            code = node.codegen(include_nested_classes=False, include_from_json_method=include_from_json_method,
+                                toplevel=False, **codegen_options)
+            generated[node.classname] = (digest, code)
+            regenerated.append(node.classname)
+
+        self.classes = generated
+        return regenerated
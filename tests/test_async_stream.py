@@ -0,0 +1,100 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+import json
+import socket
+import unittest
+
+from async_stream import from_json_async
+from unimplemented_type import UnimplementedType
+
+RECORDS = [{'name': 'ditto', 'id': i, 'types': [{'slot': 1, 'type': {'name': 'normal'}}]} for i in range(200)]
+Ditto = UnimplementedType('ditto').serialize_json(RECORDS, merge=True).build_classes()['Ditto']
+
+
+class CountingReader:
+    """
+    Stream returning one NDJSON line per read, counting the reads made
+    """
+    def __init__(self, lines):
+        self.lines = iter(lines)
+        self.reads = 0
+
+    async def read(self, n):
+        self.reads += 1
+        return next(self.lines, b'')
+
+
+class FromJsonAsyncTest(unittest.IsolatedAsyncioTestCase):
+    async def decode_socket(self, data, **kwargs):
+        """
+        Send data through a socket pair, closing the sending end, and decode what the other end receives
+        :param data: NDJSON bytes
+        :param kwargs: keyword arguments forwarded to from_json_async
+        :return: list of decoded instances
+        """
+        left, right = socket.socketpair()
+        # keep the writer of the reading end referenced, a collected writer closes its socket
+        reader, reader_writer = await asyncio.open_connection(sock=left)
+        _, writer = await asyncio.open_connection(sock=right)
+
+        async def send():
+            writer.write(data)
+            await writer.drain()
+            writer.close()
+            await writer.wait_closed()
+
+        sender = asyncio.create_task(send())
+        decoded = [obj async for obj in from_json_async(Ditto, reader, **kwargs)]
+        await sender
+        reader_writer.close()
+        return decoded
+
+    def assert_decoded(self, decoded):
+        self.assertEqual([obj.id for obj in decoded], [record['id'] for record in RECORDS])
+        self.assertTrue(all(obj.types[0].type.name == 'normal' for obj in decoded))
+
+    async def test_inline(self):
+        data = ''.join(json.dumps(record) + '\n' for record in RECORDS).encode()
+        self.assert_decoded(await self.decode_socket(data, chunk_size=100))
+
+    async def test_executor(self):
+        data = ''.join(json.dumps(record) + '\n' for record in RECORDS).encode()
+        with ThreadPoolExecutor(2) as executor:
+            self.assert_decoded(await self.decode_socket(data, chunk_size=100, executor=executor))
+
+    async def test_last_line_without_newline(self):
+        data = '\n'.join(json.dumps(record) for record in RECORDS).encode()
+        self.assert_decoded(await self.decode_socket(data, chunk_size=100))
+        with ThreadPoolExecutor(1) as executor:
+            self.assert_decoded(await self.decode_socket(data, executor=executor))
+
+    async def test_blank_lines(self):
+        data = ''.join(json.dumps(record) + '\n\n' for record in RECORDS).encode()
+        self.assert_decoded(await self.decode_socket(data, chunk_size=64))
+
+    async def test_backpressure_inline(self):
+        reader = CountingReader(json.dumps(record).encode() + b'\n' for record in RECORDS)
+        decoded = from_json_async(Ditto, reader)
+        self.assertEqual((await anext(decoded)).id, 0)
+        self.assertEqual(reader.reads, 1)
+        await decoded.aclose()
+
+    async def test_backpressure_executor(self):
+        reader = CountingReader(json.dumps(record).encode() + b'\n' for record in RECORDS)
+        with ThreadPoolExecutor(1) as executor:
+            decoded = from_json_async(Ditto, reader, executor=executor, max_pending=3)
+            self.assertEqual((await anext(decoded)).id, 0)
+            self.assertLessEqual(reader.reads, 3)
+            self.assertEqual((await anext(decoded)).id, 1)
+            self.assertLessEqual(reader.reads, 4)
+            await decoded.aclose()
+
+    async def test_invalid_arguments(self):
+        with self.assertRaises(ValueError):
+            await anext(from_json_async(Ditto, CountingReader(()), chunk_size=0))
+        with self.assertRaises(ValueError):
+            await anext(from_json_async(Ditto, CountingReader(()), max_pending=0))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,32 @@
+import pickle
+import sys
+import unittest
+
+from code_cache import CodeCache
+from unimplemented_type import UnimplementedType
+
+PAYLOAD = {'name': 'ditto', 'types': [{'slot': 1, 'type': {'name': 'normal'}}]}
+
+
+class BuildClassesTest(unittest.TestCase):
+    def test_cache_hit_returns_same_classes(self):
+        cache = CodeCache()
+        schema = UnimplementedType('ditto').serialize_json(PAYLOAD)
+        first = schema.build_classes(cache=cache)
+        ditto = first['Ditto'].from_json(PAYLOAD)
+        second = UnimplementedType('ditto').serialize_json(PAYLOAD).build_classes(cache=cache)
+        self.assertEqual(first, second)
+        self.assertIsInstance(ditto, second['Ditto'])
+        self.assertIs(type(pickle.loads(pickle.dumps(ditto))), first['Ditto'])
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+
+    def test_eviction_unregisters_module(self):
+        cache = CodeCache(maxsize=1)
+        first = UnimplementedType('first').serialize_json({'a': 1}).build_classes(cache=cache)['First']
+        self.assertIn(first.__module__, sys.modules)
+        UnimplementedType('second').serialize_json({'b': 1}).build_classes(cache=cache)
+        self.assertNotIn(first.__module__, sys.modules)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,27 @@
+import unittest
+
+from unimplemented_type import UnimplementedType
+
+RECORDS = [{'_id': 1, 'id_': 2, 'class': 3, 'detail': {'_key': 'x'}}]
+
+
+class FieldNameTest(unittest.TestCase):
+    def test_keywords(self):
+        schema = UnimplementedType('record').serialize_json(RECORDS, merge=True)
+        self.assertEqual(schema.attribute_index(), {'_id': '_id', 'id_': 'id_', 'class': 'class_', 'detail': 'detail'})
+
+    def test_namedtuple_underscores(self):
+        schema = UnimplementedType('record').serialize_json(RECORDS, merge=True)
+        Record = schema.build_classes(typed='namedtuple', include_to_json_method=True)['Record']
+        record = Record.from_json(RECORDS)[0]
+        self.assertEqual((record.id_, record.id__, record.class_, record.detail.key_), (1, 2, 3, 'x'))
+        self.assertEqual(record.to_json(), RECORDS[0])
+
+    def test_namedtuple_underscore_only(self):
+        schema = UnimplementedType('record').serialize_json({'_': 1})
+        with self.assertRaises(ValueError):
+            schema.codegen(include_from_json_method=True, typed='namedtuple')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,40 @@
+import io
+import json
+import unittest
+
+from json_stream import iter_json_array
+
+
+def parse(text, chunk_size=1 << 16):
+    return list(iter_json_array(io.StringIO(text), chunk_size=chunk_size))
+
+
+class IterJsonArrayTest(unittest.TestCase):
+    def test_elements(self):
+        records = [{'a': i, 'b': [1.5, 'x' * i, None]} for i in range(50)]
+        text = json.dumps(records, indent=1)
+        for chunk_size in (1, 7, 1 << 16):
+            self.assertEqual(parse(text, chunk_size), records)
+        self.assertEqual(list(iter_json_array(io.BytesIO(text.encode()), chunk_size=3)), records)
+
+    def test_empty(self):
+        self.assertEqual(parse(' [ ] '), [])
+        self.assertEqual(parse(''), [])
+
+    def test_not_an_array(self):
+        self.assertEqual(parse('{"a": 1}'), [{'a': 1}])
+
+    def test_invalid_separators(self):
+        for text in ('[1 2]', '[1,,2]', '[,1]', '[1,]', '[1 ,, 2]'):
+            for chunk_size in (1, 1 << 16):
+                with self.assertRaises(ValueError, msg=text):
+                    parse(text, chunk_size)
+
+    def test_unterminated(self):
+        for text in ('[1, 2', '[1,', '['):
+            with self.assertRaises(ValueError, msg=text):
+                parse(text)
+
+
+if __name__ == '__main__':
+    unittest.main()
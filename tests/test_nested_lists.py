@@ -0,0 +1,46 @@
+import io
+import json
+import unittest
+
+from unimplemented_type import UnimplementedType
+
+# lists of objects nested in lists are flattened by inference into a list of the object's class
+PAYLOAD = {'m': [[{'a': 1}, None], None, {'a': 2}, [[{'a': 3}]]]}
+
+
+def build(**codegen_options):
+    schema = UnimplementedType('root').serialize_json(PAYLOAD, merge=True)
+    return schema.build_classes(**codegen_options)['Root']
+
+
+class NestedListTest(unittest.TestCase):
+    def assert_decoded(self, root):
+        first, none, second, third = root.m
+        self.assertEqual(first[0].a, 1)
+        self.assertIsNone(first[1].a)
+        self.assertIsNone(none.a)
+        self.assertEqual(second.a, 2)
+        self.assertEqual(third[0][0].a, 3)
+
+    def test_default(self):
+        self.assert_decoded(build().from_json(PAYLOAD))
+
+    def test_optimized(self):
+        self.assert_decoded(build(optimized=True).from_json(PAYLOAD))
+        self.assert_decoded(build(optimized=True, interned=True).from_json(PAYLOAD))
+
+    def test_iterative(self):
+        self.assert_decoded(build(iterative=True).from_json(PAYLOAD))
+
+    def test_to_json(self):
+        payload = {'m': [[{'a': 1}, {'a': None}], {'a': 2}, [[{'a': 3}]]]}
+        for codegen_options in ({}, {'optimized': True}, {'iterative': True}):
+            root = build(include_to_json_method=True, **codegen_options).from_json(payload)
+            self.assertEqual(root.to_json(), payload)
+            buf = io.StringIO()
+            root.write_json(buf)
+            self.assertEqual(buf.getvalue(), json.dumps(payload))
+
+
+if __name__ == '__main__':
+    unittest.main()
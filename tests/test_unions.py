@@ -0,0 +1,31 @@
+import unittest
+
+from unimplemented_type import UnimplementedType
+
+# a field holding a scalar in some records and a list in others is inferred as a union with a list member
+RECORDS = [{'a': 1}, {'a': [1]}, {'a': 2.5}]
+
+
+def build(**codegen_options):
+    schema = UnimplementedType('record').serialize_json(RECORDS, merge=True)
+    return schema.build_classes(**codegen_options)['Record']
+
+
+class ListUnionTest(unittest.TestCase):
+    def test_typed(self):
+        for typed in ('dataclass', 'namedtuple'):
+            records = build(typed=typed).from_json(RECORDS)
+            self.assertEqual([record.a for record in records], [1, [1], 2.5])
+
+    def test_columns(self):
+        columns = build(include_columns_method=True).from_json_columns(RECORDS)
+        self.assertEqual(list(columns['a']), [1, [1], 2.5])
+
+    def test_widened(self):
+        schema = UnimplementedType('record').serialize_json([{'a': 1}, {'a': 2.5}], merge=True)
+        records = schema.build_classes(typed='dataclass')['Record'].from_json([{'a': 1}, {'a': 2.5}])
+        self.assertEqual([type(record.a) for record in records], [float, float])
+
+
+if __name__ == '__main__':
+    unittest.main()
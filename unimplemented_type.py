@@ -1,6 +1,28 @@
 from unknown_type import UnknownType
+from union_type import UnionType
 from error.not_serialized_error import NotSerializedError
+from json_stream import iter_ndjson, iter_json_array
+from code_cache import CodeCache
+from datetime import datetime
+from functools import lru_cache
+from itertools import chain, islice
+from time import perf_counter
+import hashlib
+import json
+import keyword
+import os
+import random
 import re
+import sys
+from types import ModuleType
+
+NONE_TYPE = type(None)
+# ISO 8601 date and time, recorded as datetime when serializing with detect_formats
+ISO_DATETIME = re.compile(r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}(:\d{2}(\.\d+)?)?(Z|[+-]\d{2}:\d{2})?$')
+# number of names memoized by each of the name style converters
+NAME_CACHE_SIZE = 1 << 14
+# maximum number of distinct values tracked per string field when serializing with track_values
+VALUE_SKETCH_SIZE = 64
 
 
 class UnimplementedType:
@@ -8,17 +30,193 @@ class UnimplementedType:
     Object to represent an unimplemented custom class
     """
     CLASS_HEADER = "class {}:\n"
+    CLASS_HEADER_BASE = "class {}({}):\n"
+    CLASS_SLOTS = "\t__slots__ = {}\n\n"
+    CLASS_TUPLE_NEW = "\tdef __new__(cls, {}):\n\t\treturn tuple.__new__(cls, {})\n\n"
+    CLASS_TUPLE_PROPERTY = "\t{} = property(itemgetter({}))"
+    IMPORT_STMT = "from {} import {}\n"
+    FUTURE_IMPORT = "from __future__ import annotations\n"
     CLASS_INIT = "\tdef __init__(self, {}):\n{}"
     CLASS_PARAMETER = "{}={}"
     CLASS_ASSIGNMENT = "\t\tself.{} = {}"
     CLASS_TERMINATOR = "\n\n"
+    # classname of the class enclosing the fields given to codegen_nested_classes, which is not a valid identifier
+    NESTED_CLASSES_OWNER = "<nested>"
     FROM_JSON_INIT = "\t@classmethod\n\tdef from_json(cls, json):\n"
     FROM_JSON_IMPL = "\t\tif json is None:\n\t\t\treturn {}()\n\n\t\tif type(json) is list:\n\t\t\treturn {}\n\n"
     FROM_JSON_LIST = "[{}.from_json({}) for {} in json]"
     FROM_JSON_RETURN = "\t\treturn {}({})"
     FROM_JSON_DICT_GET = "json.get('{}')"
     FROM_JSON_META_CALL = "{}.from_json({})"
-    FROM_JSON_TRY_CATCH = "\t\ttry:\n\t\t\t{} = [{} for _{} in {}]\n\t\texcept TypeError:\n\t\t\t{} = []\n\n"
+    FROM_JSON_TRY_CATCH = "\t\ttry:\n\t\t\t_{0} = [{1} for item in {2}]\n\t\texcept TypeError:\n\t\t\t_{0} = []\n\n"
+    FROM_JSON_DISPATCH = "\t\tif json is None:\n\t\t\treturn {}()\n\n\t\tif type(json) is list:\n\t\t\treturn {}\n\n" \
+                         "\t\treturn {}.from_dict(json)"
+    LAZY_NEW = "\t\tobj = {0}.__new__({0})\n"
+    LAZY_ASSIGNMENT = "\t\tobj.{} = {}\n"
+    LAZY_RAW_ASSIGNMENT = "\t\tobj._{}_json = {}\n"
+    LAZY_RETURN = "\t\treturn obj"
+    LAZY_PROPERTY = "\t@cached_property\n\tdef {0}(self):\n\t\tvalue = {1}.from_json(self._{0}_json)\n" \
+                    "\t\tdel self._{0}_json\n\t\treturn value"
+    LAZY_LIST_PROPERTY = "\t@cached_property\n\tdef {0}(self):\n\t\t_json = self._{0}_json\n" \
+                         "\t\tvalue = [] if _json is None else [{1}.from_json(_{0}) for _{0} in _json]\n" \
+                         "\t\tdel self._{0}_json\n\t\treturn value"
+    COLUMNS_INIT = "\t@classmethod\n\tdef from_json_columns(cls, json, use_numpy=False):\n" \
+                   "\t\tif json is None:\n\t\t\tjson = []\n\t\telif type(json) is not list:\n\t\t\tjson = [json]\n\n" \
+                   "\t\tcolumns = {}\n"
+    COLUMNS_ARRAY = "\t\ttry:\n\t\t\tcolumns['{0}'] = array('{1}', [_json.get('{2}') for _json in json])\n" \
+                    "\t\texcept (TypeError, OverflowError):\n\t\t\tcolumns['{0}'] = [_json.get('{2}') for _json in json]\n"
+    COLUMNS_LIST = "\t\tcolumns['{}'] = [{} for _json in json]\n"
+    COLUMNS_DICT_GET = "_json.get('{}')"
+    COLUMNS_META_CALL = "{}.from_json(_json.get('{}'){})"
+    COLUMNS_RETURN = "\n\t\treturn columns"
+    COLUMNS_NUMPY_RETURN = "\n\t\tif use_numpy:\n\t\t\timport numpy\n\t\t\tfor name, column in columns.items():\n" \
+                     "\t\t\t\tif type(column) is array:\n" \
+                     "\t\t\t\t\tcolumns[name] = numpy.frombuffer(column, dtype=column.typecode)\n\n" \
+                     "\t\treturn columns"
+    # array typecodes for primitive datatypes that can be stored in typed columns
+    ARRAY_TYPECODES = {int: 'q', float: 'd'}
+    TO_JSON_INIT = "\tdef to_json(self):\n"
+    TO_JSON_RETURN = "\t\treturn {{{}}}"
+    TO_JSON_ITEM = "{}: {}"
+    TO_JSON_ATTRIBUTE = "self.{}"
+    TO_JSON_NESTED = "None if self.{0} is None else self.{0}.to_json()"
+    TO_JSON_LIST = "None if self.{0} is None else _list_to_json(self.{0})"
+    TO_JSON_DATETIME = "None if self.{0} is None else self.{0}.isoformat()"
+    TO_JSON_DATETIME_LIST = "None if self.{0} is None else [_{0}.isoformat() for _{0} in self.{0}]"
+    WRITE_JSON_INIT = "\tdef write_json(self, buf):\n\t\twrite = buf.write\n"
+    WRITE_JSON_LITERAL = "\t\twrite({})\n"
+    WRITE_JSON_PRIMITIVE = "\t\twrite(dumps(self.{}))\n"
+    WRITE_JSON_VALUE = "\t\twrite(dumps({}))\n"
+    WRITE_JSON_NESTED = "\t\t_value = self.{}\n\t\tif _value is None:\n\t\t\twrite('null')\n\t\telse:\n" \
+                        "\t\t\t_value.write_json(buf)\n"
+    WRITE_JSON_LIST = "\t\t_value = self.{}\n\t\tif _value is None:\n\t\t\twrite('null')\n\t\telse:\n" \
+                      "\t\t\t_write_json_list(_value, buf)\n"
+    # lists of custom classes may hold nested lists, which inference flattens
+    TO_JSON_HELPERS = "def _list_to_json(values):\n" \
+                      "\treturn [_list_to_json(value) if type(value) is list else value.to_json()\n" \
+                      "\t\t\tfor value in values]\n\n\n" \
+                      "def _write_json_list(values, buf):\n\twrite = buf.write\n\twrite('[')\n" \
+                      "\tfor i, value in enumerate(values):\n\t\tif i:\n\t\t\twrite(', ')\n" \
+                      "\t\tif type(value) is list:\n\t\t\t_write_json_list(value, buf)\n" \
+                      "\t\telse:\n\t\t\tvalue.write_json(buf)\n\twrite(']')\n\n\n"
+    ITERATIVE_DECODER = "def _decode_iteratively(cls, json):\n" \
+                        "\t# decode nested objects from an explicit stack of (class, json, parent, attribute,\n" \
+                        "\t# is_list), lists nested in lists being assigned to their index in the parent list\n" \
+                        "\troot = cls.__new__(cls)\n\tstack = []\n\tcls._fill_from_json(root, json, stack)\n" \
+                        "\twhile stack:\n\t\tcls, json, parent, attribute, is_list = stack.pop()\n" \
+                        "\t\tif json is None:\n\t\t\tvalue = [] if is_list else cls()\n" \
+                        "\t\telif is_list:\n\t\t\tvalue = []\n\t\t\tfor item in json:\n" \
+                        "\t\t\t\tif item is None:\n\t\t\t\t\tvalue.append(cls())\n" \
+                        "\t\t\t\telif type(item) is list:\n" \
+                        "\t\t\t\t\tstack.append((cls, item, value, len(value), True))\n\t\t\t\t\tvalue.append(None)\n" \
+                        "\t\t\t\telse:\n\t\t\t\t\tobj = cls.__new__(cls)\n" \
+                        "\t\t\t\t\tcls._fill_from_json(obj, item, stack)\n\t\t\t\t\tvalue.append(obj)\n" \
+                        "\t\telse:\n\t\t\tvalue = cls.__new__(cls)\n\t\t\tcls._fill_from_json(value, json, stack)\n" \
+                        "\t\tif type(parent) is list:\n\t\t\tparent[attribute] = value\n" \
+                        "\t\telse:\n\t\t\tsetattr(parent, attribute, value)\n\treturn root\n\n\n"
+    ITERATIVE_RETURN = "\t\treturn _decode_iteratively({}, json)"
+    ITERATIVE_FILL_INIT = "\t@staticmethod\n\tdef _fill_from_json(obj, json, stack):\n"
+    ITERATIVE_ASSIGNMENT = "\t\tobj.{} = json.get('{}')\n"
+    ITERATIVE_PUSH = "\t\tstack.append(({}, json.get('{}'), obj, '{}', {}))\n"
+    ITERATIVE_PASS = "\t\tpass\n"
+    TYPED_DATACLASS = "@dataclass{}\nclass {}:\n"
+    TYPED_NAMEDTUPLE = "class {}(NamedTuple):\n"
+    TYPED_FIELD = "\t{}: {} = {}"
+    TYPED_LIST_DEFAULT = "_field(default_factory=list)"
+    TYPED_CONVERSION = "{}({})"
+    TYPED_LIST_CONVERSION = "_convert_list({}, {})"
+    TYPED_HELPERS = "def _to_float(value):\n\treturn None if value is None else float(value)\n\n\n" \
+                    "def _to_datetime(value):\n\tif value is None:\n\t\treturn None\n" \
+                    "\treturn datetime.fromisoformat(value[:-1] + '+00:00' if value.endswith('Z') else value)\n\n\n" \
+                    "def _convert_list(convert, values):\n" \
+                    "\treturn None if values is None else [convert(value) for value in values]\n\n\n"
+    INTERN_HELPERS = "_INTERN_SIZE = 4096\n_interned = {}\n\n\n" \
+                     "def _intern(key, value):\n\tif len(_interned) >= _INTERN_SIZE:\n" \
+                     "\t\t_interned.pop(next(iter(_interned)), None)\n\t_interned[key] = value\n\treturn value\n\n\n" \
+                     "def _intern_string(value):\n\ttry:\n\t\treturn _interned[value]\n" \
+                     "\texcept (KeyError, TypeError):\n\t\treturn _intern(value, value) if type(value) is str else value\n\n\n"
+    INTERN_STRING = "_intern_string({})"
+    INTERN_RETURN = "\t\tkey = ({0}, {1})\n\t\ttry:\n\t\t\treturn _interned[key]\n\t\texcept KeyError:\n" \
+                    "\t\t\treturn _intern(key, {0}(*key[1:]))\n\t\texcept TypeError:\n\t\t\treturn {0}(*key[1:])"
+    INSTRUMENT_HELPERS = "# calls and cumulative seconds of each class's decoding method, from_dict if it has one and from_json\n" \
+                         "# otherwise, including nested classes it decodes\n" \
+                         "decode_stats = {}\n\n\n" \
+                         "def _instrumented(cls):\n" \
+                         "\tname = 'from_dict' if 'from_dict' in vars(cls) else 'from_json'\n" \
+                         "\tdecode = getattr(cls, name).__func__\n" \
+                         "\tstats = decode_stats[cls.__name__] = [0, 0.0]\n\n" \
+                         "\tdef instrumented_decode(cls, json):\n\t\tstart = _perf_counter()\n\t\ttry:\n" \
+                         "\t\t\treturn decode(cls, json)\n\t\tfinally:\n\t\t\tstats[0] += 1\n" \
+                         "\t\t\tstats[1] += _perf_counter() - start\n\n" \
+                         "\tsetattr(cls, name, classmethod(instrumented_decode))\n\treturn cls\n\n\n" \
+                         "def reset_decode_stats():\n\tfor stats in decode_stats.values():\n" \
+                         "\t\tstats[:] = [0, 0.0]\n\n\n"
+    INSTRUMENT_DECORATOR = "@_instrumented\n"
+    CANONICAL_HELPER = "class _Canonical(dict):\n\t# values never observed during serialization are decoded as they are\n" \
+                       "\tdef __missing__(self, value):\n\t\treturn value\n\n\n"
+    CANONICAL_ENUM = "class {}(str, Enum):\n{}\n\n\n"
+    CANONICAL_MEMBER = "\t{} = {}"
+    CANONICAL_ENUM_VALUES = "{} = _Canonical({{member.value: member for member in {}}})\n\n\n"
+    CANONICAL_CONSTANT = "{} = {}\n"
+    CANONICAL_CONSTANT_VALUES = "{} = _Canonical({{value: value for value in {}}})\n\n\n"
+    CANONICAL_LOOKUP = "{}[{}]"
+    PATCH_HELPER = "def _apply_operations(obj, operations):\n\tfor operation in operations:\n" \
+                   "\t\top = operation['op']\n\t\tif op not in ('add', 'replace', 'remove'):\n" \
+                   "\t\t\traise ValueError('Unsupported patch operation {!r}'.format(op))\n" \
+                   "\t\ttokens = [token.replace('~1', '/').replace('~0', '~') for token in operation['path'].split('/')[1:]]\n" \
+                   "\t\tif not tokens:\n\t\t\traise ValueError('Cannot patch the whole document')\n\n" \
+                   "\t\t# walk to the object or list holding the target, keeping the decoder of the list's elements\n" \
+                   "\t\tparent, decode = obj, None\n\t\tfor token in tokens[:-1]:\n" \
+                   "\t\t\tif type(parent) is list:\n\t\t\t\tparent = parent[int(token)]\n\t\t\telse:\n" \
+                   "\t\t\t\tparent, decode = parent._patch_child(token)\n\n" \
+                   "\t\ttoken = tokens[-1]\n\t\tif type(parent) is not list:\n" \
+                   "\t\t\tparent.apply_patch({token: None if op == 'remove' else operation['value']})\n" \
+                   "\t\telif op == 'remove':\n\t\t\tdel parent[int(token)]\n\t\telse:\n" \
+                   "\t\t\tvalue = operation['value']\n" \
+                   "\t\t\tif decode is not None and value is not None:\n\t\t\t\tvalue = decode(value)\n" \
+                   "\t\t\tif op == 'replace':\n\t\t\t\tparent[int(token)] = value\n" \
+                   "\t\t\telif token == '-':\n\t\t\t\tparent.append(value)\n" \
+                   "\t\t\telse:\n\t\t\t\tparent.insert(int(token), value)\n\treturn obj\n\n\n"
+    PATCH_INIT = "\tdef apply_patch(self, patch):\n\t\tif type(patch) is list:\n" \
+                 "\t\t\treturn _apply_operations(self, patch)\n\n"
+    PATCH_LOOP = "\t\tfor key, value in patch.items():\n"
+    PATCH_KEY = "\t\t\t{}key == '{}':\n"
+    PATCH_ASSIGNMENT = "\t\t\t\tself.{} = {}\n"
+    PATCH_NESTED = "\t\t\t\tif type(value) is dict and self.{0} is not None:\n\t\t\t\t\tself.{0}.apply_patch(value)\n" \
+                   "\t\t\t\telse:\n\t\t\t\t\tself.{0} = None if value is None else {1}.from_json(value)\n"
+    PATCH_RETURN = "\t\treturn self"
+    PATCH_CHILD_INIT = "\tdef _patch_child(self, key):\n"
+    PATCH_CHILD = "\t\tif key == '{}':\n\t\t\treturn self.{}, {}\n"
+    PATCH_CHILD_RAISE = "\t\traise KeyError(key)"
+    VALIDATE_INIT = "\t@classmethod\n\tdef validate(cls, json, _keys={}):\n" \
+                    "\t\tif type(json) is not dict or not json.keys() <= _keys:\n\t\t\treturn False\n\n\t\tget = json.get\n"
+    VALIDATE_VALUE = "\t\tvalue = get('{}')\n"
+    VALIDATE_CHECK = "\t\tif {}:\n\t\t\treturn False\n"
+    VALIDATE_LIST = "\t\tfor item in value or ():\n" \
+                    "\t\t\tif item is not None and type(item) is not list and not {}.validate(item):\n" \
+                    "\t\t\t\treturn False\n"
+    VALIDATE_RETURN = "\t\treturn True"
+    FROM_DICT_INIT = "\t@classmethod\n\tdef from_dict(cls, json):\n"
+    FROM_DICT_GET = "{}.get('{}')"
+    FROM_DICT_LOCAL = "\t\t_{} = json.get('{}')\n"
+    FROM_DICT_NESTED = "{0}() if {1} is None else {2}"
+    FROM_DICT_CALL = "{}.from_dict({})"
+    FROM_DICT_CONSTRUCT = "{}({})"
+    FROM_DICT_LIST = "\t\t_{0} = [] if _{0} is None else [{1} for item in _{0}]\n"
+    FROM_DICT_LIST_ITEM = "{0}.from_json(item) if type(item) is list else {1}"
+    PACKAGE_IMPORT = "from .{} import {}\n"
+    PACKAGE_MODULE_ENTRY = "\t{!r}: {!r},\n"
+    PACKAGE_INIT = "from importlib import import_module\n\n__all__ = [{}]\n\n_modules = {{\n{}}}\n\n\n" \
+                   "def __getattr__(name):\n\tif name not in _modules:\n" \
+                   "\t\traise AttributeError('module {{!r}} has no attribute {{!r}}'.format(__name__, name))\n\n" \
+                   "\tvalue = globals()[name] = getattr(import_module(_modules[name], __name__), name)\n" \
+                   "\treturn value\n\n\n" \
+                   "def __dir__():\n\treturn __all__\n"
+
+    # compiled modules built by UnimplementedType.build_classes, keyed by schema fingerprint and options
+    code_cache = CodeCache()
+    # Instrumentation recording counts and timings of inference and codegen, None when disabled
+    instrumentation = None
 
     def __init__(self, classname, style='underscore'):
         """
@@ -30,34 +228,548 @@ class UnimplementedType:
         self.implementation = ""
         self.style = style
         self.is_serialized = False
+        # number of JSON objects folded into this schema and number of those in which each field was present and non-null
+        self.sample_count = 0
+        self.field_counts = {}
+        # distinct values of string fields when tracked, or None for fields with more than VALUE_SKETCH_SIZE values
+        self.field_values = {}
 
-    def serialize_json(self, json):
+    def serialize_json(self, json, merge=False, sample_size=None, seed=None, detect_formats=False,
+                       track_values=False):
         """
         Serialize JSON into UnimplementedType
+        By default only the first element of every list is inspected. With merge=True every element (or a reservoir
+        sample of sample_size elements per list) is folded into a single schema tree, fields missing or null in some
+        elements are tracked as optional and fields seen with conflicting datatypes become UnionTypes.
+        Merging visits every sampled JSON node once, so it runs in time linear in the number of sampled nodes and holds
+        memory proportional to the schema size and nesting depth (plus sample_size elements per list being sampled),
+        not the payload size.
         :param json: dict-like JSON object
+        :param merge: when True, fold every list element into the schema instead of only the first
+        :param sample_size: when merging, maximum number of elements of each list to fold, chosen uniformly at random
+        :param seed: seed for the random sampling of list elements
+        :param detect_formats: when True, strings holding ISO 8601 timestamps are recorded as datetime
+        :param track_values: when True, the distinct values of string fields are tracked, up to VALUE_SKETCH_SIZE per
+            field, see UnimplementedType.low_cardinality_values
         :return: UnimplementedType object containing schema information from JSON input
         """
-        is_list = type(json) is list
-        if is_list:
-            json = json[0]
+        sample = UnimplementedType.list_sampler(merge, sample_size, seed)
+
+        if type(json) is list:
+            return self.fold_elements(sample(json), sample, detect_formats, track_values)
 
         if type(json) is not dict:
             return type(json)
 
+        self.fold_json(json, sample, detect_formats, track_values)
+        return self
+
+    def serialize_stream(self, source, format='ndjson', merge=False, sample_size=None, seed=None,
+                         detect_formats=False, track_values=False):
+        """
+        Serialize a stream of JSON records into UnimplementedType without materializing the whole payload
+        Records are parsed and folded one at a time, so memory is bounded by the schema size and the largest single
+        record (or sample_size records when sampling), not by the size of the source. The resulting schema is the
+        same as serialize_json would produce for the list of all records.
+        :param source: path to a file or a file-like object, in text or binary mode
+        :param format: 'ndjson' for one JSON document per line or 'array' for a single top-level JSON array
+        :param merge: when True, fold every record into the schema instead of only the first
+        :param sample_size: when merging, maximum number of records (and elements of each nested list) to fold
+        :param seed: seed for the random sampling of records and list elements
+        :param detect_formats: when True, strings holding ISO 8601 timestamps are recorded as datetime
+        :param track_values: when True, the distinct values of string fields are tracked, see serialize_json
+        :return: UnimplementedType object containing schema information from the JSON records
+        """
+        if format == 'ndjson':
+            records = iter_ndjson(source)
+        elif format == 'array':
+            records = iter_json_array(source)
+        else:
+            raise ValueError("format must be 'ndjson' or 'array'")
+
+        sample = UnimplementedType.list_sampler(merge, sample_size, seed)
+        if not merge:
+            records = islice(records, 1)
+        elif sample_size is not None:
+            records = UnimplementedType.reservoir_sample(records, sample_size, random.Random(seed))
+
+        return self.fold_elements(records, sample, detect_formats, track_values)
+
+    @staticmethod
+    def reservoir_sample(iterable, k, rng):
+        """
+        Choose k elements uniformly at random from an iterable of unknown length in a single pass
+        :param iterable: elements to sample
+        :param k: maximum number of elements to choose
+        :param rng: random.Random instance
+        :return: list of chosen elements, in their original order
+        """
+        reservoir = []
+        for i, element in enumerate(iterable):
+            if i < k:
+                reservoir.append((i, element))
+                continue
+            j = rng.randint(0, i)
+            if j < k:
+                reservoir[j] = (i, element)
+        reservoir.sort(key=lambda entry: entry[0])
+        return [element for _, element in reservoir]
+
+    def fold_elements(self, elements, sample, detect_formats=False, track_values=False):
+        """
+        Fold the elements of a top-level JSON list into this UnimplementedType's schema
+        :param elements: iterable of JSON values
+        :param sample: list sampling function, see UnimplementedType.list_sampler
+        :param detect_formats: see UnimplementedType.serialize_json
+        :param track_values: see UnimplementedType.serialize_json
+        :return: self if any element was an object, otherwise the merged datatype of the elements
+        """
+        dtype = None
+        for element in elements:
+            if type(element) is dict:
+                self.fold_json(element, sample, detect_formats, track_values)
+            else:
+                dtype = UnimplementedType.merge_dtypes(dtype,
+                                                       UnimplementedType.primitive_dtype(element, detect_formats))
+        if not self.is_serialized:
+            return dtype
+        return self
+
+    @staticmethod
+    def list_sampler(merge=False, sample_size=None, seed=None):
+        """
+        Create a function choosing which elements of a list are inspected during serialization
+        :param merge: when False, only the first element of a list is inspected
+        :param sample_size: when merging, maximum number of elements to inspect per list
+        :param seed: seed for the random choice of elements
+        :return: function taking a list and returning a list of elements to inspect, in their original order
+        """
+        if not merge:
+            return lambda lst: lst[:1]
+
+        if sample_size is None:
+            return lambda lst: lst
+
+        if sample_size <= 0:
+            raise ValueError("sample_size must be positive")
+
+        rng = random.Random(seed)
+
+        def sample(lst):
+            if len(lst) <= sample_size:
+                return lst
+            # sampling indices keeps memory at O(sample_size) and preserves element order
+            return [lst[i] for i in sorted(rng.sample(range(len(lst)), sample_size))]
+
+        return sample
+
+    def fold_json(self, json, sample, detect_formats=False, track_values=False):
+        """
+        Fold a single JSON object into this UnimplementedType's schema
+        Nested objects are folded from an explicit work stack rather than by recursion, in the same depth-first order,
+        so the nesting depth of the payload is limited only by memory. The objects of a list are folded from an
+        iterator over it, so the stack holds one entry per enclosing object or list rather than one per element.
+        :param json: dict JSON object
+        :param sample: list sampling function, see UnimplementedType.list_sampler
+        :param detect_formats: see UnimplementedType.serialize_json
+        :param track_values: see UnimplementedType.serialize_json
+        :return: self
+        """
+        instrumentation = UnimplementedType.instrumentation
+        stack = [(self, json)]
+        while stack:
+            node, obj = stack[-1]
+            if type(obj) is dict:
+                stack.pop()
+            elif node is not None:
+                # iterator over a list of objects of the node's class: fold its next object and keep the rest
+                for obj in obj:
+                    if type(obj) is dict:
+                        break
+                else:
+                    stack.pop()
+                    continue
+            else:
+                # generator flattening nested lists, see UnimplementedType.iter_elements
+                element = next(obj, None)
+                if element is None:
+                    stack.pop()
+                    continue
+                node, obj = element
+            start = len(stack)
+            if instrumentation is None:
+                node.fold_fields(obj, sample, stack, detect_formats, track_values)
+            else:
+                began = perf_counter()
+                node.fold_fields(obj, sample, stack, detect_formats, track_values)
+                instrumentation.record_node(node.classname, began)
+            if len(stack) - start > 1:
+                # pop nested objects in document order
+                stack[start:] = stack[start:][::-1]
+
+        return self
+
+    def fold_fields(self, json, sample, pending, detect_formats=False, track_values=False):
+        """
+        Fold the fields of a single JSON object into this UnimplementedType's schema, without descending into objects
+        :param json: dict JSON object
+        :param sample: list sampling function, see UnimplementedType.list_sampler
+        :param pending: list to which nested objects and lists still to be folded are appended, see
+            UnimplementedType.infer_elements
+        :param detect_formats: see UnimplementedType.serialize_json
+        :param track_values: see UnimplementedType.serialize_json
+        """
+        self.sample_count += 1
+        nested_classes, field_counts = self.nested_classes, self.field_counts
         for field, obj in json.items():
-            dtype = type(obj)
-            if dtype is dict:
-                dtype = UnimplementedType(field, style=self.style) \
-                    .serialize_json(obj) if obj != {} else UnknownType()
-            if dtype is list:
-                dtype = [UnimplementedType(field, style=self.style)
-                         .serialize_json(obj[0])] if len(obj) > 0 else [UnknownType()]
-            self.nested_classes[field] = dtype
+            if obj is None:
+                dtype = NONE_TYPE
+            else:
+                dtype = type(obj)
+                field_counts[field] = field_counts.get(field, 0) + 1
+                if track_values and dtype is str:
+                    self.track_value(field, obj)
+
+            current = nested_classes.get(field)
+            if dtype is current:
+                # fast path: primitive datatype already recorded for the field
+                continue
+            if dtype is dict and type(current) is UnimplementedType and obj:
+                # fast path: object of an already recorded custom class
+                pending.append((current, obj))
+                continue
+            nested_classes[field] = self.infer_dtype(field, obj, current, sample, pending, detect_formats)
 
         self.is_serialized = True
+
+    def track_value(self, field, value):
+        """
+        Add a value to the distinct values tracked for a string field, giving up on fields with too many values
+        :param field: fieldname
+        :param value: string value
+        """
+        values = self.field_values.setdefault(field, set())
+        if values is None or value in values:
+            return
+        if len(values) >= VALUE_SKETCH_SIZE:
+            self.field_values[field] = None
+        else:
+            values.add(value)
+
+    def infer_dtype(self, field, obj, current, sample, pending, detect_formats=False):
+        """
+        Infer the datatype of a field value and merge it with the datatype previously recorded for the field
+        :param field: fieldname, used as classname for nested custom classes
+        :param obj: field value
+        :param current: datatype previously recorded for the field, or None
+        :param sample: list sampling function, see UnimplementedType.list_sampler
+        :param pending: list to which nested objects and lists still to be folded are appended, see
+            UnimplementedType.infer_elements
+        :param detect_formats: see UnimplementedType.serialize_json
+        :return: merged datatype
+        """
+        dtype = type(obj)
+        if dtype is dict:
+            if obj == {}:
+                return UnimplementedType.merge_dtypes(current, UnknownType())
+            nested = UnimplementedType.structured_member(current, UnimplementedType)
+            if nested is None:
+                nested = UnimplementedType(field, style=self.style)
+                current = UnimplementedType.merge_dtypes(current, nested)
+            pending.append((nested, obj))
+            return current
+
+        if dtype is list:
+            nested = UnimplementedType.structured_member(current, list)
+            if nested is None:
+                nested = [UnknownType()]
+                current = UnimplementedType.merge_dtypes(current, nested)
+            if obj:
+                self.infer_elements(field, sample(obj), nested, sample, pending, detect_formats)
+            return current
+
+        return UnimplementedType.merge_dtypes(current, UnimplementedType.primitive_dtype(obj, detect_formats))
+
+    def infer_elements(self, field, lst, container, sample, pending, detect_formats=False):
+        """
+        Merge the datatypes of the elements of a list into its list datatype and queue the objects among them to be
+        folded, appending a single entry to pending for the whole list
+        The elements of a flat list are inspected at once, and its objects are folded from a (UnimplementedType, list
+        iterator) entry. A list holding nested lists is flattened as it is folded, from a (None, generator) entry, see
+        UnimplementedType.iter_elements.
+        :param field: fieldname of the list, used as classname for nested custom classes
+        :param lst: sampled list value
+        :param container: list datatype of the field, whose element datatype is updated in place
+        :param sample: list sampling function, see UnimplementedType.list_sampler
+        :param pending: list to which the entry of the list is appended
+        :param detect_formats: see UnimplementedType.serialize_json
+        """
+        nested = None
+        for element in lst:
+            dtype = type(element)
+            if dtype is dict:
+                if nested is None:
+                    nested = UnimplementedType.structured_member(container[0], UnimplementedType)
+                if nested is None:
+                    nested = UnimplementedType(field, style=self.style)
+                    container[0] = UnimplementedType.merge_dtypes(container[0], nested)
+            elif dtype is list:
+                # the elements already inspected are merged again, which leaves the element datatype unchanged
+                pending.append((None, self.iter_elements(field, lst, container, sample, detect_formats)))
+                return
+            else:
+                container[0] = UnimplementedType.merge_dtypes(container[0],
+                                                              UnimplementedType.primitive_dtype(element, detect_formats))
+        if nested is not None:
+            pending.append((nested, iter(lst)))
+
+    def iter_elements(self, field, lst, container, sample, detect_formats=False):
+        """
+        Merge the datatypes of the elements of a list into its list datatype, flattening nested lists, and yield the
+        objects among them to be folded
+        Elements are inspected as the generator is consumed, so flattening holds one iterator per nested list rather
+        than the elements themselves.
+        :param field: fieldname of the list, used as classname for nested custom classes
+        :param lst: sampled list value
+        :param container: list datatype of the field, whose element datatype is updated in place
+        :param sample: list sampling function, see UnimplementedType.list_sampler
+        :param detect_formats: see UnimplementedType.serialize_json
+        :return: generator of (UnimplementedType, dict) pairs of nested objects
+        """
+        nested = None
+        # stack of iterators over the nested lists being flattened
+        lists = [iter(lst)]
+        while lists:
+            for element in lists[-1]:
+                dtype = type(element)
+                if dtype is list:
+                    lists.append(iter(sample(element)))
+                    break
+                if dtype is dict:
+                    if nested is None:
+                        nested = UnimplementedType.structured_member(container[0], UnimplementedType)
+                    if nested is None:
+                        nested = UnimplementedType(field, style=self.style)
+                        container[0] = UnimplementedType.merge_dtypes(container[0], nested)
+                    yield nested, element
+                else:
+                    container[0] = UnimplementedType.merge_dtypes(
+                        container[0], UnimplementedType.primitive_dtype(element, detect_formats))
+            else:
+                lists.pop()
+
+    @staticmethod
+    def primitive_dtype(obj, detect_formats=False):
+        """
+        Datatype of a primitive JSON value
+        :param obj: JSON value other than an object or list
+        :param detect_formats: see UnimplementedType.serialize_json
+        :return: type of the value, or datetime for a string holding an ISO 8601 timestamp when detecting formats
+        """
+        dtype = type(obj)
+        if detect_formats and dtype is str and ISO_DATETIME.match(obj):
+            return datetime
+        return dtype
+
+    @staticmethod
+    def structured_member(dtype, kind):
+        """
+        Find the custom class or list datatype within a (possibly union) datatype
+        :param dtype: datatype to search
+        :param kind: UnimplementedType or list
+        :return: matching datatype, or None
+        """
+        for member in (dtype.members if type(dtype) is UnionType else (dtype,)):
+            if type(member) is kind:
+                return member
+        return None
+
+    @staticmethod
+    def merge_dtypes(a, b, pending=None):
+        """
+        Merge two datatypes observed for the same field
+        Null and unknown (empty) datatypes are subsumed by any other datatype, custom classes and lists are merged
+        recursively and any other conflict produces a UnionType
+        :param a: datatype, or None if nothing has been observed yet
+        :param b: datatype
+        :param pending: when given, pairs of custom classes are appended to it to be merged later instead of immediately
+        :return: merged datatype
+        """
+        if a is None or a is b:
+            return b
+        if b is None or a == b:
+            return a
+        if a is NONE_TYPE or type(a) is UnknownType:
+            return b
+        if b is NONE_TYPE or type(b) is UnknownType:
+            return a
+        if type(a) is UnimplementedType and type(b) is UnimplementedType:
+            if pending is None:
+                return a.merge(b)
+            pending.append((a, b))
+            return a
+        if type(a) is list and type(b) is list:
+            return [UnimplementedType.merge_dtypes(a[0], b[0], pending)]
+
+        # merge each member of b into the matching custom class or list member of a, otherwise add it to the union
+        members = list(a.members if type(a) is UnionType else (a,))
+        for member in (b.members if type(b) is UnionType else (b,)):
+            for i, existing in enumerate(members):
+                if type(existing) is type(member) and type(member) in (UnimplementedType, list):
+                    members[i] = UnimplementedType.merge_dtypes(existing, member, pending)
+                    break
+                if existing == member:
+                    break
+            else:
+                members.append(member)
+        return UnionType(members) if len(members) > 1 else members[0]
+
+    def merge(self, other):
+        """
+        Merge another UnimplementedType's schema into this one
+        Merging is associative, so schemas inferred from separate shards of a payload can be combined in any grouping
+        and yield the schema of the whole payload. Nested schemas of other may be adopted into this tree, so other
+        should not be modified afterwards. Nested schemas are merged from an explicit work stack.
+        :param other: UnimplementedType to merge
+        :return: self
+        """
+        stack = [(self, other)]
+        while stack:
+            node, other = stack.pop()
+            node.merge_fields(other, stack)
+
         return self
 
+    def merge_fields(self, other, pending):
+        """
+        Merge the counts and field datatypes of another UnimplementedType into this one, without merging nested schemas
+        :param other: UnimplementedType to merge
+        :param pending: list to which pairs of custom classes observed for the same field are appended
+        """
+        self.sample_count += other.sample_count
+        for field, count in other.field_counts.items():
+            self.field_counts[field] = self.field_counts.get(field, 0) + count
+        for field, values in other.field_values.items():
+            self.field_values[field] = UnimplementedType.merge_values(self.field_values.get(field, set()), values)
+        for field, dtype in other.nested_classes.items():
+            self.nested_classes[field] = UnimplementedType.merge_dtypes(self.nested_classes.get(field), dtype, pending)
+
+        self.is_serialized = self.is_serialized or other.is_serialized
+
+    @staticmethod
+    def merge_values(a, b):
+        """
+        Merge the distinct values tracked for a string field in two schemas
+        :param a: set of values, or None if too many values were seen
+        :param b: set of values, or None if too many values were seen
+        :return: new set of values, or None if the merged values exceed VALUE_SKETCH_SIZE
+        """
+        if a is None or b is None:
+            return None
+        values = a | b
+        return values if len(values) <= VALUE_SKETCH_SIZE else None
+
+    def low_cardinality_values(self):
+        """
+        String fields that took only a few distinct values, each repeated on average, during serialization with
+        track_values
+        A field qualifies when it always had a string datatype, its values did not overflow the VALUE_SKETCH_SIZE
+        sketch and it was present at least twice as many times as it had distinct values.
+        :return: dict with keys: fieldnames and values: sorted lists of distinct values
+        """
+        return {field: sorted(values) for field, values in self.field_values.items()
+                if values and self.nested_classes.get(field) is str
+                and self.field_counts.get(field, 0) >= 2 * len(values)}
+
+    def optional_fields(self):
+        """
+        Fields that were missing or null in at least one serialized JSON object
+        :return: set of fieldnames
+        """
+        return {field for field in self.nested_classes if self.field_counts.get(field, 0) < self.sample_count}
+
+    def project(self, paths, classname=None):
+        """
+        Prune the schema to the given field paths, for generating decoders that skip every other field
+        A path is a sequence of fieldnames separated by dots, where a fieldname holding a list of JSON objects may be
+        suffixed with [], e.g. 'name', 'stats[].base_stat' or 'types[].type.name'. A path ending at a custom class
+        selects its whole subtree. Fields keep their order in the schema; selected subtrees are shared with this schema
+        rather than copied.
+        :param paths: iterable of field paths
+        :param classname: name of the projected root class, defaults to this class's name
+        :return: new UnimplementedType containing only the selected fields
+        """
+        if not self.is_serialized:
+            raise NotSerializedError("No response JSON has been serialized")
+
+        # tree of selected fieldnames, with True marking a field selected with its whole subtree
+        selection = {}
+        for path in paths:
+            node, selected = self, selection
+            fieldnames = path.split('.')
+            for i, segment in enumerate(fieldnames):
+                fieldname = segment[:-2] if segment.endswith('[]') else segment
+                if fieldname not in node.nested_classes:
+                    raise ValueError("Unknown field {!r} in path {!r}".format(fieldname, path))
+
+                dtype = node.nested_classes[fieldname]
+                if segment.endswith('[]'):
+                    if type(dtype) is not list:
+                        raise ValueError("Field {!r} in path {!r} is not a list".format(fieldname, path))
+                if i == len(fieldnames) - 1:
+                    selected[fieldname] = True
+                    break
+
+                if type(dtype) is list and len(dtype) > 0:
+                    dtype = dtype[0]
+                if type(dtype) is not UnimplementedType:
+                    raise ValueError("Field {!r} in path {!r} is not a JSON object or list of JSON objects"
+                                     .format(fieldname, path))
+                if selected.get(fieldname) is True:
+                    # an enclosing field is already selected whole
+                    break
+                node, selected = dtype, selected.setdefault(fieldname, {})
+
+        projection = UnimplementedType.projected_node(self, selection)
+        if classname is not None:
+            projection.classname = classname
+
+        # stack of (schema node, projected node, selection) to fill in
+        stack = [(self, projection, selection)]
+        while stack:
+            node, projected, selected = stack.pop()
+            for fieldname, dtype in node.nested_classes.items():
+                if fieldname not in selected:
+                    continue
+                if selected[fieldname] is True:
+                    projected.nested_classes[fieldname] = dtype
+                    continue
+
+                nested = dtype[0] if type(dtype) is list else dtype
+                child = UnimplementedType.projected_node(nested, selected[fieldname])
+                projected.nested_classes[fieldname] = [child] if type(dtype) is list else child
+                stack.append((nested, child, selected[fieldname]))
+
+        return projection
+
+    @staticmethod
+    def projected_node(node, selected):
+        """
+        Create an empty projection of a schema node, for use in UnimplementedType.project
+        :param node: UnimplementedType to project
+        :param selected: dict of selected fieldnames
+        :return: new UnimplementedType with the node's classname, style and sample counts of the selected fields
+        """
+        projected = UnimplementedType(node.classname, style=node.style)
+        projected.is_serialized = True
+        projected.sample_count = node.sample_count
+        projected.field_counts = {field: count for field, count in node.field_counts.items() if field in selected}
+        projected.field_values = {field: None if values is None else set(values)
+                                  for field, values in node.field_values.items() if field in selected}
+        return projected
+
     @staticmethod
+    @lru_cache(maxsize=NAME_CACHE_SIZE)
     def snaked_to_camelcase(s):
         """
         Converts a string separated by underscores to camelCase
@@ -68,6 +780,7 @@ class UnimplementedType:
         return re.sub(r'(?!^)_([a-zA-Z])', lambda m: m.group(1).upper(), s)
 
     @staticmethod
+    @lru_cache(maxsize=NAME_CACHE_SIZE)
     def camelcase_to_snaked(s):
         """
         Converts a camelCase string to a string separated by underscores
@@ -77,6 +790,41 @@ class UnimplementedType:
         """
         return re.sub(r'(?<!^)(?=[A-Z])', '_', s).lower()
 
+    def attribute_name(self, fieldname):
+        """
+        Name of the generated attribute for a field, formatted according to this UnimplementedType's style
+        :param fieldname: fieldname
+        :return: attribute name
+        """
+        if self.style == 'underscore':
+            return UnimplementedType.camelcase_to_snaked(fieldname)
+        return UnimplementedType.snaked_to_camelcase(fieldname)
+
+    def attribute_index(self, namedtuple=False):
+        """
+        Map the wire key of each field, as recorded during inference, to a distinct generated attribute name
+        Generated decoders look fields up by their wire key and assign them to the attribute; wire keys converting to
+        the same attribute (e.g. gameIndices and game_indices), to a Python keyword or to the self and cls parameters of
+        generated constructors get trailing underscores.
+        :param namedtuple: when True, leading underscores, which NamedTuple field names cannot have, are moved to the
+            end of the attribute name, e.g. _id becomes id_
+        :return: dict with keys: wire keys and values: attribute names, in field order
+        """
+        index, used = {}, {'self', 'cls'}
+        for fieldname in self.nested_classes:
+            attribute = self.attribute_name(fieldname)
+            if namedtuple and attribute.startswith('_'):
+                stripped = attribute.lstrip('_')
+                if not stripped:
+                    raise ValueError("Field {!r} of {} cannot be named in a NamedTuple".format(fieldname,
+                                                                                                self.classname))
+                attribute = stripped + '_' * (len(attribute) - len(stripped))
+            while attribute in used or keyword.iskeyword(attribute):
+                attribute += '_'
+            used.add(attribute)
+            index[fieldname] = attribute
+        return index
+
     @staticmethod
     def capitalize(s):
         """
@@ -102,51 +850,415 @@ class UnimplementedType:
         return s[0].lower() if strlen == 1 else s[0].lower() + s[1:]
 
     @staticmethod
-    def codegen_nested_classes(classes, implementations=None, include_from_json_method=False):
+    def codegen_nested_classes(classes, implementations=None, include_from_json_method=False, **codegen_options):
         """
         Traverse through nested class UnimplementedType representations and codegen each
-        For use in UnimplementedType.codegen when include_nested_classes is True
+        Classnames are resolved as by UnimplementedType.resolve_classnames for a class holding the given fields, so
+        nested classes are named after their field and classes sharing a resolved classname are generated once.
         :param include_from_json_method: whether or not to include from_json method in codgens
         :param classes: nested classes dict
         :param implementations: accumulator dict during traversal
+        :param codegen_options: further keyword arguments forwarded to UnimplementedType.codegen
         :return: list of generated class code for all nested classes
         """
         if implementations is None:
             implementations = {}
 
-        for fieldname, dtype in classes.items():
-            if type(dtype) is list:
-                if len(dtype) > 0:
-                    dtype = dtype[0]
+        # the enclosing class is not generated, so it gets a name that no nested class can be resolved to
+        owner = UnimplementedType(UnimplementedType.NESTED_CLASSES_OWNER)
+        owner.nested_classes = classes
+        for dtype in owner.resolve_classnames()[1:]:
+            if dtype.classname not in implementations:
+                implementations[dtype.classname] = dtype.codegen(include_nested_classes=False,
+                                                                 include_from_json_method=include_from_json_method,
+                                                                 toplevel=False, **codegen_options)
+
+        return list(implementations.values())
 
-            if type(dtype) is not UnimplementedType or fieldname in implementations:
-                # type is primitive or has already been recorded
+    @staticmethod
+    def iter_nested_classes(classes, seen=None):
+        """
+        Traverse through nested class UnimplementedType representations, yielding each resolved classname once
+        The traversal uses an explicit stack, visiting classes in depth-first order; a class is yielded before its own
+        nested classes are visited.
+        :param classes: nested classes dict
+        :param seen: optional iterable of classnames not to yield
+        :return: generator of UnimplementedType objects
+        """
+        visited = set(seen or ())
+
+        # stack of iterators over the fields of the classes being traversed
+        stack = [iter(classes.items())]
+        while stack:
+            for fieldname, dtype in stack[-1]:
+                if type(dtype) is list:
+                    if len(dtype) > 0:
+                        dtype = dtype[0]
+
+                if type(dtype) is not UnimplementedType or dtype.classname in visited:
+                    # type is primitive or has already been recorded
+                    continue
+
+                visited.add(dtype.classname)
+                yield dtype
+                stack.append(iter(dtype.nested_classes.items()))
+                break
+            else:
+                stack.pop()
+
+    @staticmethod
+    def nested_nodes(dtype):
+        """
+        Custom classes directly contained in a datatype, looking through lists and unions
+        :param dtype: datatype
+        :return: list of UnimplementedTypes
+        """
+        if type(dtype) is UnimplementedType:
+            return [dtype]
+        if type(dtype) is list:
+            return UnimplementedType.nested_nodes(dtype[0]) if dtype else []
+        if type(dtype) is UnionType:
+            return [node for member in dtype.members for node in UnimplementedType.nested_nodes(member)]
+        return []
+
+    def fingerprint(self, memo=None):
+        """
+        Canonical structural fingerprint of this UnimplementedType's schema
+        Two schemas have the same fingerprint when they have the same fieldnames with the same datatypes, regardless of
+        classnames and field order. Nested schemas are fingerprinted first from an explicit stack.
+        :param memo: dict caching fingerprints by node id for the duration of a traversal
+        :return: hex digest
+        """
+        if memo is None:
+            memo = {}
+
+        stack = [self]
+        while stack:
+            node = stack[-1]
+            if id(node) in memo:
+                stack.pop()
                 continue
 
-            implementations[fieldname] = dtype.codegen(include_nested_classes=False,
-                                                       include_from_json_method=include_from_json_method)
-            UnimplementedType.codegen_nested_classes(dtype.nested_classes, implementations,
-                                                     include_from_json_method=include_from_json_method)
+            missing = [nested for dtype in node.nested_classes.values() if type(dtype) is not type
+                       for nested in UnimplementedType.nested_nodes(dtype) if id(nested) not in memo]
+            if missing:
+                stack.extend(missing)
+                continue
 
-        return list(implementations.values())
+            signature = ','.join([repr(fieldname) + ':' + UnimplementedType.dtype_signature(dtype, memo)
+                                  for fieldname, dtype in sorted(node.nested_classes.items())])
+            memo[id(node)] = hashlib.sha1(signature.encode('utf-8')).hexdigest()
+            stack.pop()
+
+        return memo[id(self)]
+
+    @staticmethod
+    def dtype_signature(dtype, memo):
+        """
+        Canonical string representation of a datatype, for use in UnimplementedType.fingerprint
+        :param dtype: datatype
+        :param memo: dict caching fingerprints by node id
+        :return: signature string
+        """
+        if type(dtype) is type:
+            return dtype.__name__
+        if type(dtype) is UnimplementedType:
+            return memo[id(dtype)] if id(dtype) in memo else dtype.fingerprint(memo)
+        if type(dtype) is list:
+            return '[{}]'.format(UnimplementedType.dtype_signature(dtype[0], memo) if dtype else '')
+        if type(dtype) is UnionType:
+            return 'union({})'.format('|'.join(sorted(UnimplementedType.dtype_signature(member, memo)
+                                                      for member in dtype.members)))
+        if type(dtype) is UnknownType:
+            return 'unknown'
+        return dtype.__name__
+
+    def resolve_classnames(self, deduplicate_shapes=False):
+        """
+        Assign a unique classname to every nested custom class, in the order classes are generated
+        Nested classes are named after their field. Classes with the same name and the same structural fingerprint
+        share the name and are generated once; a class whose name is already taken by a different shape gets the
+        lowest free numeric suffix, e.g. Version2. A class named like one of its enclosing classes is a recursive
+        structure (e.g. replies to replies), which is generated as one class merged from every level, see
+        UnimplementedType.merge_recursive_classes. With deduplicate_shapes, every class with the same fingerprint as an
+        earlier class reuses that class's name regardless of its field, so identical shapes are generated once.
+        :param deduplicate_shapes: when True, identical shapes under different fieldnames share one class
+        :return: list of UnimplementedTypes to generate, one per distinct classname, starting with this class or its
+            merge with nested classes of the same name
+        """
+        memo = {}
+        self.classname = UnimplementedType.snaked_to_camelcase(UnimplementedType.capitalize(self.classname))
+        views, members = UnimplementedType.merge_recursive_classes(self)
+        root = views.get(id(self), self)
+        root.classname = self.classname
+        # classname to fingerprint of the class generated under it, fingerprint to first classname, and classname by id
+        # of the class generated for a node
+        names = {root.classname: root.fingerprint(memo)}
+        shapes = {names[root.classname]: root.classname}
+        named = {id(root): root.classname}
+        classes = [root]
+
+        # stack of iterators over the fields of the classes being traversed
+        stack = [iter(root.nested_classes.items())]
+        while stack:
+            for fieldname, dtype in stack[-1]:
+                if type(dtype) is list and len(dtype) > 0:
+                    dtype = dtype[0]
+                if type(dtype) is not UnimplementedType:
+                    continue
+
+                node = views.get(id(dtype), dtype)
+                if id(node) in named:
+                    dtype.classname = named[id(node)]
+                    continue
+
+                shape = node.fingerprint(memo)
+                if deduplicate_shapes and shape in shapes:
+                    dtype.classname = node.classname = named[id(node)] = shapes[shape]
+                    continue
+
+                basename = UnimplementedType.capitalize(UnimplementedType.snaked_to_camelcase(fieldname))
+                classname, suffix = basename, 1
+                while classname in names and names[classname] != shape:
+                    suffix += 1
+                    classname = basename + str(suffix)
+
+                dtype.classname = node.classname = named[id(node)] = classname
+                if classname in names:
+                    # identical shape already generated under this classname
+                    continue
+
+                names[classname] = shape
+                shapes.setdefault(shape, classname)
+                classes.append(node)
+                stack.append(iter(node.nested_classes.items()))
+                break
+            else:
+                stack.pop()
+
+        # levels of recursive structures that no generated class refers to share the name of their merged class
+        for view_id, nodes in members.items():
+            for node in nodes:
+                node.classname = named.get(view_id, node.classname)
+
+        return classes
+
+    @staticmethod
+    def merge_recursive_classes(root):
+        """
+        Merge every nested class named like one of its enclosing classes into that class, for use in
+        UnimplementedType.resolve_classnames
+        Each level of a recursive structure may have been observed with different fields, so its class is generated from
+        the merge of all levels. Merging two classes also merges the classes of the fields they share. Merges are made
+        into new UnimplementedTypes, leaving the schema unchanged.
+        :param root: UnimplementedType whose classname has been normalized
+        :return: dict of node id to merged UnimplementedType, for nodes merged with another, and dict of merged
+            UnimplementedType id to the list of nodes merged into it
+        """
+        views, members = {}, {}
+
+        # stack of (iterator over fields, basename) of the nodes being traversed, basename being None for levels of a
+        # recursive structure, and nodes by basename of the classes enclosing the current one
+        stack = [(iter(root.nested_classes.items()), root.classname)]
+        enclosing = {root.classname: root}
+        while stack:
+            for fieldname, dtype in stack[-1][0]:
+                if type(dtype) is list and len(dtype) > 0:
+                    dtype = dtype[0]
+                if type(dtype) is not UnimplementedType:
+                    continue
+
+                basename = UnimplementedType.capitalize(UnimplementedType.snaked_to_camelcase(fieldname))
+                if basename not in enclosing:
+                    enclosing[basename] = dtype
+                    stack.append((iter(dtype.nested_classes.items()), basename))
+                    break
+
+                pending = [(enclosing[basename], dtype)]
+                while pending:
+                    a, b = pending.pop()
+                    view, other = views.get(id(a)), views.get(id(b))
+                    if view is not None and view is other:
+                        continue
+                    if view is None:
+                        view = UnimplementedType.merged_view(a)
+                        views[id(a)], members[id(view)] = view, [a]
+
+                    view.merge_fields(b if other is None else other, pending)
+                    for node in ([b] if other is None else members.pop(id(other))):
+                        views[id(node)] = view
+                        members[id(view)].append(node)
+
+                stack.append((iter(dtype.nested_classes.items()), None))
+                break
+            else:
+                basename = stack.pop()[1]
+                if basename is not None:
+                    del enclosing[basename]
+
+        return views, members
+
+    @staticmethod
+    def merged_view(node):
+        """
+        Copy a schema node's counts and fields, sharing its nested schemas, for use in
+        UnimplementedType.merge_recursive_classes
+        :param node: UnimplementedType to copy
+        :return: new UnimplementedType
+        """
+        view = UnimplementedType(node.classname, style=node.style)
+        view.is_serialized = node.is_serialized
+        view.sample_count = node.sample_count
+        view.field_counts = dict(node.field_counts)
+        view.field_values = {field: None if values is None else set(values)
+                             for field, values in node.field_values.items()}
+        view.nested_classes = dict(node.nested_classes)
+        return view
+
+    @staticmethod
+    def tuple_literal(items):
+        """
+        Formats a sequence of code strings as a tuple literal
+        :param items: list of code strings
+        :return: tuple literal, e.g. (a, b) or (a,)
+        """
+        return '({},)'.format(items[0]) if len(items) == 1 else '({})'.format(', '.join(items))
 
     @staticmethod
-    def codegen_from_json_method(classname, fields):
+    def codegen_imports(slots=False, frozen=False, optimized=False, lazy=False, iterative=False, interned=False,
+                        typed=None, instrumented=False, low_cardinality=None, include_columns_method=False,
+                        include_to_json_method=False, include_validate_method=False, include_apply_patch_method=False):
+        """
+        Generate import statements required by generated classes
+        :param slots: whether classes are generated with __slots__
+        :param frozen: whether classes are generated as frozen tuples
+        :param optimized: whether classes have optimized decoders
+        :param lazy: whether classes decode nested custom classes lazily
+        :param iterative: whether classes decode nested custom classes without recursion
+        :param interned: whether decoders share identical leaf objects and strings
+        :param typed: None, or 'dataclass' or 'namedtuple' when classes are generated with annotated fields
+        :param instrumented: whether decoding methods count calls and decode time
+        :param low_cardinality: None, or 'enum' or 'constants' when low-cardinality string fields are decoded to shared
+            values
+        :param include_columns_method: whether classes have a from_json_columns method
+        :param include_to_json_method: whether classes have to_json and write_json methods
+        :param include_validate_method: whether classes have a validate method
+        :param include_apply_patch_method: whether classes have an apply_patch method
+        :return: import statements followed by a blank separator, or an empty string if nothing is imported
+        """
+        imports = []
+        if typed:
+            # annotations are kept as strings, so that classes can refer to classes defined after them
+            imports.append(UnimplementedType.FUTURE_IMPORT)
+            if typed == 'dataclass':
+                imports.append(UnimplementedType.IMPORT_STMT.format('dataclasses', 'dataclass, field as _field'))
+            imports.append(UnimplementedType.IMPORT_STMT.format('datetime', 'datetime'))
+            imports.append(UnimplementedType.IMPORT_STMT.format(
+                'typing', 'Any, List, NamedTuple, Optional, Union' if typed == 'namedtuple'
+                else 'Any, List, Optional, Union'))
+        if include_to_json_method:
+            imports.append(UnimplementedType.IMPORT_STMT.format('json', 'dumps'))
+        if include_columns_method:
+            imports.append(UnimplementedType.IMPORT_STMT.format('array', 'array'))
+        if lazy:
+            imports.append(UnimplementedType.IMPORT_STMT.format('functools', 'cached_property'))
+        if frozen and not typed:
+            imports.append(UnimplementedType.IMPORT_STMT.format('operator', 'itemgetter'))
+        if instrumented:
+            imports.append(UnimplementedType.IMPORT_STMT.format('time', 'perf_counter as _perf_counter'))
+        if low_cardinality == 'enum':
+            imports.append(UnimplementedType.IMPORT_STMT.format('enum', 'Enum'))
+        return ''.join(imports) + '\n\n' if imports else ''
+
+    @staticmethod
+    def codegen_header(include_from_json_method=False, **codegen_options):
+        """
+        Generate the module-level code preceding generated classes: import statements and helper functions
+        :param include_from_json_method: whether classes have from_json methods
+        :param codegen_options: further keyword arguments of UnimplementedType.codegen
+        :return: module header, or an empty string if none is required
+        """
+        if codegen_options.get('include_apply_patch_method') and not include_from_json_method:
+            raise ValueError("apply_patch decodes patched nested classes with from_json and requires "
+                             "include_from_json_method")
+        if codegen_options.get('instrumented') and not include_from_json_method:
+            raise ValueError("instrumented wraps from_json methods and requires include_from_json_method")
+
+        header = UnimplementedType.codegen_imports(**codegen_options)
+        if codegen_options.get('include_apply_patch_method'):
+            header += UnimplementedType.PATCH_HELPER
+        if codegen_options.get('iterative') and include_from_json_method:
+            header += UnimplementedType.ITERATIVE_DECODER
+        if codegen_options.get('interned') and include_from_json_method:
+            header += UnimplementedType.INTERN_HELPERS
+        if codegen_options.get('typed') and include_from_json_method:
+            header += UnimplementedType.TYPED_HELPERS
+        if codegen_options.get('include_to_json_method'):
+            header += UnimplementedType.TO_JSON_HELPERS
+        if codegen_options.get('instrumented'):
+            header += UnimplementedType.INSTRUMENT_HELPERS
+        if codegen_options.get('low_cardinality'):
+            header += UnimplementedType.CANONICAL_HELPER
+        return header
+
+    @staticmethod
+    def is_internable(fields):
+        """
+        Whether instances of a custom class can be shared between identical JSON objects when decoding with interning
+        A class is internable when it is a leaf of the schema whose fields all have a single primitive datatype, so
+        that the tuple of its field values is hashable and identifies the instance.
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :return: bool
+        """
+        return all(type(dtype) is type for dtype in fields.values())
+
+    @staticmethod
+    def codegen_constructor_return(classname, fields, parameters, interned=False, typed=None, canonical=None):
+        """
+        Generate the statement returning a new custom class instance from a from_json or from_dict method
+        With interning, an internable class is looked up by its field values in the module's interning cache first.
+        :param classname: custom class classname
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param parameters: list of constructor argument expressions
+        :param interned: whether decoders share identical leaf objects and strings
+        :param typed: when set, convert field values to their annotated datatypes, see UnimplementedType.converter
+        :param canonical: dict of fieldname to the _Canonical dict its values are mapped through, or None
+        :return: return statement
+        """
+        if typed:
+            parameters = [UnimplementedType.converted(parameter, dtype)
+                          for parameter, dtype in zip(parameters, fields.values())]
+        if canonical:
+            parameters = [UnimplementedType.CANONICAL_LOOKUP.format(canonical[fieldname], parameter)
+                          if fieldname in canonical else parameter for parameter, fieldname in zip(parameters, fields)]
+        if interned and UnimplementedType.is_internable(fields):
+            return UnimplementedType.INTERN_RETURN.format(classname, ', '.join(parameters))
+        if interned:
+            # share repeated strings of classes that are not interned as a whole
+            parameters = [UnimplementedType.INTERN_STRING.format(parameter)
+                          if dtype is str and fieldname not in (canonical or ()) else parameter
+                          for parameter, (fieldname, dtype) in zip(parameters, fields.items())]
+        return UnimplementedType.FROM_JSON_RETURN.format(classname, ', '.join(parameters))
+
+    @staticmethod
+    def codegen_from_json_method(classname, fields, attributes, interned=False, typed=None, canonical=None):
         """
         Generate code for a custom class's from_json method
         :param classname: custom class classname
         :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname, from which local variable names are derived
+        :param interned: when True, share identical leaf objects and strings, see UnimplementedType.is_internable
+        :param typed: when set, convert field values to their annotated datatypes, see UnimplementedType.converter
+        :param canonical: dict of fieldname to the _Canonical dict its values are mapped through, or None
         :return: implementation for custom class's from_json method
         """
         # start implementation with classmethod annotation, from_json declaration
-        implementation = UnimplementedType.FROM_JSON_INIT
-        classname_lowercase = UnimplementedType.lowercase(classname)
+        implementation = [UnimplementedType.FROM_JSON_INIT]
         # create list comprehension statement, e.g. [User.from_json(user) for user in json]
-        list_comprehension_stmt = UnimplementedType.FROM_JSON_LIST.format(classname, classname_lowercase,
-                                                                          classname_lowercase)
+        list_comprehension_stmt = UnimplementedType.list_comprehension(classname)
         # append to implementation null checking and list checking for input json
         #   if json is list, call from_json for each element of json list
-        implementation += UnimplementedType.FROM_JSON_IMPL.format(classname, list_comprehension_stmt)
+        implementation.append(UnimplementedType.FROM_JSON_IMPL.format(classname, list_comprehension_stmt))
 
         # list of parameters to pass to base custom class from_json method
         parameters = []
@@ -154,12 +1266,10 @@ class UnimplementedType:
         for fieldname, dtype in fields.items():
             if type(dtype) is UnimplementedType:
                 # type is custom, parameter will be of form Class.from_json(json.get('class'))
-                field_classname_uppercase = UnimplementedType.capitalize(dtype.classname)
-                fieldname_camelcased = UnimplementedType.snaked_to_camelcase(fieldname)
-                fieldname_classname = UnimplementedType.capitalize(fieldname_camelcased)
+                fieldname_classname = dtype.classname
 
-                # create json get statement, e.g. json.get('class')
-                json_get_stmt = UnimplementedType.FROM_JSON_DICT_GET.format(fieldname_camelcased)
+                # create json get statement with the field's wire key, e.g. json.get('class')
+                json_get_stmt = UnimplementedType.FROM_JSON_DICT_GET.format(fieldname)
                 # append to parameters custom class from_json call passed the json.get statement
                 parameters.append(
                     UnimplementedType.FROM_JSON_META_CALL.format(fieldname_classname, json_get_stmt)
@@ -172,72 +1282,996 @@ class UnimplementedType:
                     continue
 
                 # list is not empty and nested type is custom
-                fieldname_camelcased = UnimplementedType.snaked_to_camelcase(fieldname)
-                fieldname_classname = UnimplementedType.capitalize(fieldname_camelcased)
-
-                # create json get statement, e.g. json.get('class')
-                json_get_stmt = UnimplementedType.FROM_JSON_DICT_GET.format(fieldname_camelcased)
-                # create custom class from_json statement, e.g. Class.from_json(json.get('class'))
-                from_json_stmt = UnimplementedType.FROM_JSON_META_CALL.format(
-                    fieldname_classname, '_' + fieldname)
-                # add to implementation try-catch clause for creation of a list of custom classes via list comprehension
-                implementation += UnimplementedType.FROM_JSON_TRY_CATCH.format(
-                    fieldname, from_json_stmt, fieldname, json_get_stmt, fieldname
-                )
-                parameters.append(fieldname)
-            elif type(dtype) is type:
-                # type is primitive, no custom class from_json call is necessary, use simple json.get
+                fieldname_classname = dtype[0].classname
+
+                # create json get statement with the field's wire key, e.g. json.get('class')
+                json_get_stmt = UnimplementedType.FROM_JSON_DICT_GET.format(fieldname)
+                # create custom class from_json statement for each list element, e.g. Class.from_json(item)
+                from_json_stmt = UnimplementedType.FROM_JSON_META_CALL.format(fieldname_classname, 'item')
+                # add to implementation try-catch clause for creation of a list of custom classes via list comprehension,
+                # assigned to a local named after the attribute, e.g. _class_
+                implementation.append(UnimplementedType.FROM_JSON_TRY_CATCH.format(
+                    attributes[fieldname], from_json_stmt, json_get_stmt
+                ))
+                parameters.append('_' + attributes[fieldname])
+            else:
+                # type is primitive, unknown or a union, no custom class from_json call is necessary, use simple json.get
                 parameters.append(UnimplementedType.FROM_JSON_DICT_GET.format(fieldname))
 
         # add to implementation from_json call for base custom class with parameters joined by commas
-        implementation += UnimplementedType.FROM_JSON_RETURN.format(classname, ', '.join(parameters))
+        implementation.append(UnimplementedType.codegen_constructor_return(classname, fields, parameters, interned,
+                                                                           typed, canonical))
+        return ''.join(implementation)
+
+    @staticmethod
+    def codegen_optimized_from_json_method(classname, fields, attributes, interned=False, typed=None, canonical=None,
+                                           inline_leaves=False):
+        """
+        Generate code for a custom class's from_json method and the from_dict method it dispatches to
+        from_dict decodes a single JSON object whose shape is known from the schema: nested custom classes are decoded
+        by calling their from_dict directly, skipping the list dispatch of from_json, and with inline_leaves, nested
+        classes without nested custom classes of their own are constructed in place, saving a method call per object.
+        :param classname: custom class classname
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname, from which local variable names are derived
+        :param interned: when True, share identical leaf objects and strings, see UnimplementedType.is_internable
+        :param typed: when set, convert field values to their annotated datatypes, see UnimplementedType.converter
+        :param canonical: dict of fieldname to the _Canonical dict its values are mapped through, or None
+        :param inline_leaves: when True, construct nested leaf classes in place; only valid when their from_dict passes
+            field values to the constructor unchanged
+        :return: implementation for custom class's from_json and from_dict methods
+        """
+        # from_json keeps its None and list handling and hands single objects to from_dict
+        implementation = UnimplementedType.FROM_JSON_INIT
+        list_comprehension_stmt = UnimplementedType.list_comprehension(classname)
+        implementation += UnimplementedType.FROM_JSON_DISPATCH.format(classname, list_comprehension_stmt, classname)
+        implementation += '\n\n' + UnimplementedType.FROM_DICT_INIT
+
+        # list of parameters to pass to base custom class constructor
+        parameters = []
+
+        for fieldname, dtype in fields.items():
+            if type(dtype) is list and len(dtype) > 0 and type(dtype[0]) is UnimplementedType:
+                # list of custom classes, e.g. _class_ = [] if _class_ is None else [Class.from_json(item) if
+                # type(item) is list else Class() if item is None else Class.from_dict(item) for item in _class_];
+                # elements may be nested lists, which inference flattens, so these are dispatched by from_json
+                implementation += UnimplementedType.FROM_DICT_LOCAL.format(attributes[fieldname], fieldname)
+                implementation += UnimplementedType.FROM_DICT_LIST.format(
+                    attributes[fieldname], UnimplementedType.FROM_DICT_LIST_ITEM.format(
+                        dtype[0].classname, UnimplementedType.nested_from_dict(dtype[0], 'item', inline_leaves)))
+                parameters.append('_' + attributes[fieldname])
+            elif type(dtype) is UnimplementedType:
+                # custom class, e.g. Class() if _class_ is None else Class.from_dict(_class_)
+                implementation += UnimplementedType.FROM_DICT_LOCAL.format(attributes[fieldname], fieldname)
+                parameters.append(UnimplementedType.nested_from_dict(dtype, '_' + attributes[fieldname], inline_leaves))
+            else:
+                # primitive, unknown or union datatype, or list of those, use simple get
+                parameters.append(UnimplementedType.FROM_DICT_GET.format('json', fieldname))
+
+        implementation += UnimplementedType.codegen_constructor_return(classname, fields, parameters, interned, typed,
+                                                                       canonical)
+        return implementation
+
+    @staticmethod
+    def nested_from_dict(dtype, variable, inline_leaves=False):
+        """
+        Generate the expression decoding a nested custom class from a possibly null JSON object in a from_dict method
+        :param dtype: nested UnimplementedType
+        :param variable: name of the variable holding the JSON object
+        :param inline_leaves: when True and the class has no nested custom classes, construct it in place instead of
+            calling its from_dict
+        :return: expression, e.g. Class() if item is None else Class.from_dict(item)
+        """
+        if inline_leaves and all(UnimplementedType.nested_classname(fieldname, nested) is None
+                                 for fieldname, nested in dtype.nested_classes.items()):
+            decoded = UnimplementedType.FROM_DICT_CONSTRUCT.format(dtype.classname, ', '.join(
+                [UnimplementedType.FROM_DICT_GET.format(variable, fieldname) for fieldname in dtype.nested_classes]))
+        else:
+            decoded = UnimplementedType.FROM_DICT_CALL.format(dtype.classname, variable)
+        return UnimplementedType.FROM_DICT_NESTED.format(dtype.classname, variable, decoded)
+
+    @staticmethod
+    def codegen_iterative_from_json_method(classname, fields, attributes):
+        """
+        Generate code for a custom class's from_json method decoding nested custom classes without recursion
+        from_json hands single objects to the module-level _decode_iteratively function, which calls the generated
+        _fill_from_json method of each class to assign primitive fields and push nested custom class fields onto its
+        work stack, so the nesting depth of decoded payloads is limited only by memory.
+        :param classname: custom class classname
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname
+        :return: implementation for custom class's from_json and _fill_from_json methods
+        """
+        implementation = UnimplementedType.FROM_JSON_INIT
+        list_comprehension_stmt = UnimplementedType.list_comprehension(classname)
+        implementation += UnimplementedType.FROM_JSON_IMPL.format(classname, list_comprehension_stmt)
+        implementation += UnimplementedType.ITERATIVE_RETURN.format(classname)
+        implementation += '\n\n' + UnimplementedType.ITERATIVE_FILL_INIT
+
+        if not fields:
+            implementation += UnimplementedType.ITERATIVE_PASS
+        for fieldname, dtype in fields.items():
+            nested_classname = UnimplementedType.nested_classname(fieldname, dtype)
+            if nested_classname is None:
+                implementation += UnimplementedType.ITERATIVE_ASSIGNMENT.format(attributes[fieldname], fieldname)
+            else:
+                # e.g. stack.append((Class, json.get('class'), obj, 'class', False))
+                implementation += UnimplementedType.ITERATIVE_PUSH.format(
+                    nested_classname, fieldname, attributes[fieldname],
+                    type(dtype) is list)
+
+        return implementation.rstrip('\n')
+
+    @staticmethod
+    def list_comprehension(classname):
+        """
+        Generate the list comprehension decoding each element of a JSON list with a custom class's from_json method
+        :param classname: custom class classname
+        :return: list comprehension, e.g. [User.from_json(user) for user in json], whose loop variable gets trailing
+            underscores if the lowercased classname is a Python keyword, e.g. from_ for From
+        """
+        variable = UnimplementedType.lowercase(classname)
+        while keyword.iskeyword(variable):
+            variable += '_'
+        return UnimplementedType.FROM_JSON_LIST.format(classname, variable, variable)
+
+    @staticmethod
+    def nested_classname(fieldname, dtype):
+        """
+        Name of the custom class a field is decoded into
+        :param fieldname: fieldname
+        :param dtype: datatype of the field
+        :return: classname if the field is a custom class or a list of custom classes, otherwise None
+        """
+        if type(dtype) is list and len(dtype) > 0:
+            dtype = dtype[0]
+        if type(dtype) is not UnimplementedType:
+            return None
+        return dtype.classname
+
+    @staticmethod
+    def codegen_lazy_from_json_method(classname, fields, attributes, optimized=False):
+        """
+        Generate code for a custom class's from_json method that defers decoding of nested custom classes
+        Nested custom class fields keep their raw JSON and are decoded on first access by the properties generated by
+        UnimplementedType.codegen_lazy_properties; other fields are assigned directly.
+        :param classname: custom class classname
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname
+        :param optimized: when True, from_json dispatches single objects to a from_dict method
+        :return: implementation for custom class's from_json (and from_dict) methods
+        """
+        implementation = UnimplementedType.FROM_JSON_INIT
+        list_comprehension_stmt = UnimplementedType.list_comprehension(classname)
+        if optimized:
+            implementation += UnimplementedType.FROM_JSON_DISPATCH.format(classname, list_comprehension_stmt,
+                                                                          classname)
+            implementation += '\n\n' + UnimplementedType.FROM_DICT_INIT
+        else:
+            implementation += UnimplementedType.FROM_JSON_IMPL.format(classname, list_comprehension_stmt)
+
+        # create the instance without calling __init__, which would shadow the lazy properties
+        implementation += UnimplementedType.LAZY_NEW.format(classname)
+        for fieldname, dtype in fields.items():
+            if UnimplementedType.nested_classname(fieldname, dtype) is None:
+                implementation += UnimplementedType.LAZY_ASSIGNMENT.format(
+                    attributes[fieldname], UnimplementedType.FROM_JSON_DICT_GET.format(fieldname))
+            else:
+                # keep raw JSON for the property to decode, e.g. obj._class_json = json.get('class')
+                implementation += UnimplementedType.LAZY_RAW_ASSIGNMENT.format(
+                    attributes[fieldname], UnimplementedType.FROM_JSON_DICT_GET.format(fieldname))
+
+        implementation += UnimplementedType.LAZY_RETURN
+        return implementation
+
+    @staticmethod
+    def codegen_lazy_properties(fields, attributes):
+        """
+        Generate cached properties decoding nested custom class fields on first access
+        The decoded value is cached in the instance __dict__, so later accesses are plain attribute lookups, and the
+        raw JSON is released.
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname
+        :return: implementation for the properties, or an empty string if no field is a custom class
+        """
+        properties = []
+        for fieldname, dtype in fields.items():
+            nested_classname = UnimplementedType.nested_classname(fieldname, dtype)
+            if nested_classname is None:
+                continue
+            template = UnimplementedType.LAZY_LIST_PROPERTY if type(dtype) is list else UnimplementedType.LAZY_PROPERTY
+            properties.append(template.format(attributes[fieldname], nested_classname))
+        return '\n\n'.join(properties)
+
+    @staticmethod
+    def array_typecode(dtype):
+        """
+        Typecode of the array.array able to hold a primitive datatype
+        :param dtype: datatype
+        :return: array typecode, or None if the datatype cannot be stored in a typed array
+        """
+        if type(dtype) is UnionType:
+            # members may be lists or custom classes, which cannot be looked up
+            typecodes = {UnimplementedType.ARRAY_TYPECODES.get(member) if type(member) is type else None
+                         for member in dtype.members}
+            # unions of ints and floats widen to float
+            return 'd' if typecodes == {'q', 'd'} else None
+        if type(dtype) is not type:
+            return None
+        return UnimplementedType.ARRAY_TYPECODES.get(dtype)
+
+    @staticmethod
+    def codegen_columns_method(fields, attributes, optional_fields):
+        """
+        Generate code for a custom class's from_json_columns method, decoding a list of JSON objects into one column per
+        field instead of one instance per object
+        Integer and float fields that were never missing or null are stored in array.array columns (or numpy arrays
+        sharing their buffer when use_numpy is True), falling back to lists if the data does not fit; other fields are
+        stored in lists, with nested custom classes decoded by their from_json methods.
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname, used as column names
+        :param optional_fields: fieldnames that may be missing or null
+        :return: implementation for custom class's from_json_columns method
+        """
+        implementation = UnimplementedType.COLUMNS_INIT
+        has_arrays = False
+        for fieldname, dtype in fields.items():
+            nested_classname = UnimplementedType.nested_classname(fieldname, dtype)
+            typecode = UnimplementedType.array_typecode(dtype)
+            if nested_classname is not None:
+                # e.g. Class.from_json(_json.get('class')), defaulting lists of custom classes to an empty list
+                implementation += UnimplementedType.COLUMNS_LIST.format(
+                    attributes[fieldname], UnimplementedType.COLUMNS_META_CALL.format(
+                        nested_classname, fieldname, ' or []' if type(dtype) is list else ''))
+            elif typecode is not None and fieldname not in optional_fields:
+                implementation += UnimplementedType.COLUMNS_ARRAY.format(attributes[fieldname], typecode, fieldname)
+                has_arrays = True
+            else:
+                implementation += UnimplementedType.COLUMNS_LIST.format(
+                    attributes[fieldname], UnimplementedType.COLUMNS_DICT_GET.format(fieldname))
+
+        # only typed array columns can be converted to numpy arrays
+        implementation += UnimplementedType.COLUMNS_NUMPY_RETURN if has_arrays else UnimplementedType.COLUMNS_RETURN
         return implementation
 
-    def codegen(self, include_nested_classes=False, include_from_json_method=False):
+    @staticmethod
+    def codegen_typed_field(attribute, dtype, typed):
+        """
+        Generate the annotated declaration of a field of a dataclass or NamedTuple
+        Fields default to None, except lists of dataclasses which default to a new empty list.
+        :param attribute: attribute name
+        :param dtype: datatype
+        :param typed: 'dataclass' or 'namedtuple'
+        :return: field declaration
+        """
+        annotation = UnimplementedType.annotation(dtype)
+        if type(dtype) is list and typed == 'dataclass':
+            return UnimplementedType.TYPED_FIELD.format(attribute, annotation, UnimplementedType.TYPED_LIST_DEFAULT)
+        return UnimplementedType.TYPED_FIELD.format(attribute, 'Optional[{}]'.format(annotation), None)
+
+    @staticmethod
+    def annotation(dtype):
+        """
+        Type annotation of a field's decoded value
+        :param dtype: datatype
+        :return: annotation expression
+        """
+        if type(dtype) is UnimplementedType:
+            return dtype.classname
+        if type(dtype) is list:
+            return 'List[{}]'.format(UnimplementedType.annotation(dtype[0]) if dtype else 'Any')
+        if type(dtype) is UnionType:
+            widened = UnimplementedType.widened_dtype(dtype)
+            if widened is not None:
+                return widened.__name__
+            # unions are decoded as raw JSON values
+            names = []
+            for member in dtype.members:
+                name = 'Any' if type(member) is UnknownType else 'dict' if type(member) is UnimplementedType \
+                    else 'list' if type(member) is list else 'str' if member is datetime else member.__name__
+                if name not in names:
+                    names.append(name)
+            return 'Any' if 'Any' in names else 'Union[{}]'.format(', '.join(names))
+        if type(dtype) is UnknownType or dtype is NONE_TYPE:
+            return 'Any'
+        return dtype.__name__
+
+    @staticmethod
+    def widened_dtype(dtype):
+        """
+        Single datatype able to represent every member of a union: float for ints and floats, str for strings some of
+        which are timestamps
+        :param dtype: UnionType
+        :return: float, str, or None if the union cannot be widened
+        """
+        # members may be lists, which cannot be hashed
+        if all(member in (int, float) for member in dtype.members):
+            return float
+        if all(member in (str, datetime) for member in dtype.members):
+            return str
+        return None
+
+    @staticmethod
+    def converter(dtype):
+        """
+        Name of the generated helper converting a JSON value to its annotated datatype
+        :param dtype: primitive or union datatype
+        :return: helper name, or None if the JSON value already has the annotated datatype
+        """
+        if dtype is datetime:
+            return '_to_datetime'
+        if type(dtype) is UnionType and UnimplementedType.widened_dtype(dtype) is float:
+            return '_to_float'
+        return None
+
+    @staticmethod
+    def converted(expression, dtype):
+        """
+        Wrap an expression evaluating to a field's JSON value in the conversion to the field's annotated datatype
+        :param expression: expression
+        :param dtype: datatype
+        :return: converting expression, or the expression itself if no conversion is needed
+        """
+        if type(dtype) is list:
+            convert = UnimplementedType.converter(dtype[0]) if dtype else None
+            return expression if convert is None else UnimplementedType.TYPED_LIST_CONVERSION.format(convert, expression)
+        convert = UnimplementedType.converter(dtype)
+        return expression if convert is None else UnimplementedType.TYPED_CONVERSION.format(convert, expression)
+
+    @staticmethod
+    def is_datetime(dtype):
+        """
+        :param dtype: datatype
+        :return: whether a field of the datatype holds a datetime, or list of datetimes, when decoded with typed
+        """
+        return dtype is datetime or (type(dtype) is list and len(dtype) > 0 and dtype[0] is datetime)
+
+    @staticmethod
+    def datetime_to_json(attribute, dtype):
+        """
+        Generate the expression formatting a datetime field back to its JSON value
+        :param attribute: attribute name
+        :param dtype: datetime or list of datetime
+        :return: expression
+        """
+        if type(dtype) is list:
+            return UnimplementedType.TO_JSON_DATETIME_LIST.format(attribute)
+        return UnimplementedType.TO_JSON_DATETIME.format(attribute)
+
+    @staticmethod
+    def codegen_to_json_method(fields, attributes, typed=None):
+        """
+        Generate code for a custom class's to_json method, building a JSON dict with the original field keys
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname
+        :param typed: when set, datetime fields hold datetimes and are formatted back to ISO 8601
+        :return: implementation for custom class's to_json method
+        """
+        items = []
+        for fieldname, dtype in fields.items():
+            attribute = attributes[fieldname]
+            if typed and UnimplementedType.is_datetime(dtype):
+                value = UnimplementedType.datetime_to_json(attribute, dtype)
+            elif UnimplementedType.nested_classname(fieldname, dtype) is None:
+                value = UnimplementedType.TO_JSON_ATTRIBUTE.format(attribute)
+            elif type(dtype) is list:
+                value = UnimplementedType.TO_JSON_LIST.format(attribute)
+            else:
+                value = UnimplementedType.TO_JSON_NESTED.format(attribute)
+            items.append(UnimplementedType.TO_JSON_ITEM.format(repr(fieldname), value))
+
+        return UnimplementedType.TO_JSON_INIT + UnimplementedType.TO_JSON_RETURN.format(', '.join(items))
+
+    @staticmethod
+    def codegen_write_json_method(fields, attributes, typed=None):
+        """
+        Generate code for a custom class's write_json method, writing the same JSON text as json.dumps(self.to_json())
+        directly to a file-like object without building intermediate dicts
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname
+        :param typed: when set, datetime fields hold datetimes and are formatted back to ISO 8601
+        :return: implementation for custom class's write_json method
+        """
+        implementation = UnimplementedType.WRITE_JSON_INIT
+        # constant text is accumulated so that separators and keys are written in a single call
+        literal = '{'
+        for fieldname, dtype in fields.items():
+            if literal != '{':
+                literal += ', '
+            literal += json.dumps(fieldname) + ': '
+            implementation += UnimplementedType.WRITE_JSON_LITERAL.format(repr(literal))
+            literal = ''
+
+            attribute = attributes[fieldname]
+            if typed and UnimplementedType.is_datetime(dtype):
+                implementation += UnimplementedType.WRITE_JSON_VALUE.format(
+                    UnimplementedType.datetime_to_json(attribute, dtype))
+            elif UnimplementedType.nested_classname(fieldname, dtype) is None:
+                implementation += UnimplementedType.WRITE_JSON_PRIMITIVE.format(attribute)
+            elif type(dtype) is list:
+                implementation += UnimplementedType.WRITE_JSON_LIST.format(attribute)
+            else:
+                implementation += UnimplementedType.WRITE_JSON_NESTED.format(attribute)
+
+        implementation += UnimplementedType.WRITE_JSON_LITERAL.format(repr(literal + '}'))
+        return implementation.rstrip('\n')
+
+    @staticmethod
+    def codegen_apply_patch_method(fields, attributes, typed=None, canonical=None):
+        """
+        Generate code for a custom class's apply_patch and _patch_child methods, updating an instance in place
+        apply_patch takes either a partial JSON object, whose keys replace the matching fields, or a list of JSON Patch
+        style operations. Nested custom class fields patched with an object are updated recursively; any other patched
+        value is decoded on its own, so the cost of an update depends on the size of the patch and not of the instance.
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param attributes: generated attribute name for each fieldname
+        :param typed: when set, values are converted to the fields' annotated datatypes
+        :param canonical: dict of fieldname to the _Canonical dict its values are mapped through, or None
+        :return: implementation for custom class's apply_patch and _patch_child methods
+        """
+        implementation = [UnimplementedType.PATCH_INIT]
+        children = []
+        if fields:
+            implementation.append(UnimplementedType.PATCH_LOOP)
+        for i, (fieldname, dtype) in enumerate(fields.items()):
+            attribute = attributes[fieldname]
+            classname = UnimplementedType.nested_classname(fieldname, dtype)
+            implementation.append(UnimplementedType.PATCH_KEY.format('elif ' if i else 'if ', fieldname))
+            if classname is None:
+                value = UnimplementedType.converted('value', dtype) if typed else 'value'
+                if canonical and fieldname in canonical:
+                    value = UnimplementedType.CANONICAL_LOOKUP.format(canonical[fieldname], value)
+                implementation.append(UnimplementedType.PATCH_ASSIGNMENT.format(attribute, value))
+            elif type(dtype) is list:
+                implementation.append(UnimplementedType.PATCH_ASSIGNMENT.format(
+                    attribute, 'None if value is None else {}.from_json(value)'.format(classname)))
+            else:
+                implementation.append(UnimplementedType.PATCH_NESTED.format(attribute, classname))
+                children.append(UnimplementedType.PATCH_CHILD.format(fieldname, attribute, None))
+            if type(dtype) is list:
+                # list elements added by JSON Patch operations are decoded on their own
+                decode = classname + '.from_json' if classname is not None \
+                    else (UnimplementedType.converter(dtype[0]) if typed and dtype else None)
+                children.append(UnimplementedType.PATCH_CHILD.format(fieldname, attribute, decode))
+        implementation.append(UnimplementedType.PATCH_RETURN)
+
+        implementation.append('\n\n')
+        implementation.append(UnimplementedType.PATCH_CHILD_INIT)
+        implementation.extend(children)
+        implementation.append(UnimplementedType.PATCH_CHILD_RAISE)
+        return ''.join(implementation)
+
+    def codegen_canonical_values(self, attributes, low_cardinality):
+        """
+        Generate a str Enum, or module-level constants, for each of this class's low-cardinality string fields, each
+        followed by the _Canonical dict that decoders map the field's values through
+        Enums are named after the class and attribute, e.g. TypeName for the name field of class Type, and constants
+        are prefixed with the same name in upper case, e.g. TYPE_NAME_BUG.
+        :param attributes: generated attribute name for each fieldname
+        :param low_cardinality: 'enum' or 'constants'
+        :return: (implementation, dict with keys: fieldnames and values: names of the _Canonical dicts)
+        """
+        implementation, canonical = [], {}
+        for fieldname, values in self.low_cardinality_values().items():
+            name = self.classname + UnimplementedType.capitalize(
+                UnimplementedType.snaked_to_camelcase(attributes[fieldname]))
+            prefix = UnimplementedType.camelcase_to_snaked(name)
+            canonical[fieldname] = '_{}_values'.format(prefix)
+            members = UnimplementedType.constant_names(values)
+            if low_cardinality == 'enum':
+                implementation.append(UnimplementedType.CANONICAL_ENUM.format(name, '\n'.join(
+                    [UnimplementedType.CANONICAL_MEMBER.format(member, repr(value))
+                     for member, value in zip(members, values)])))
+                implementation.append(UnimplementedType.CANONICAL_ENUM_VALUES.format(canonical[fieldname], name))
+            else:
+                constants = ['{}_{}'.format(prefix.upper(), member) for member in members]
+                implementation.extend([UnimplementedType.CANONICAL_CONSTANT.format(constant, repr(value))
+                                       for constant, value in zip(constants, values)])
+                implementation.append(UnimplementedType.CANONICAL_CONSTANT_VALUES.format(
+                    canonical[fieldname], UnimplementedType.tuple_literal(constants)))
+        return ''.join(implementation), canonical
+
+    @staticmethod
+    def constant_names(values):
+        """
+        Distinct upper case identifiers for string values, for use as Enum member or constant names
+        :param values: list of strings
+        :return: list of identifiers, e.g. ['BUG', 'SPECIAL_ATTACK', 'VALUE_1']
+        """
+        names = []
+        for value in values:
+            name = re.sub(r'\W+', '_', value, flags=re.ASCII).strip('_').upper()
+            if not name[:1].isalpha():
+                name = 'VALUE_' + name
+            while name in names:
+                name += '_'
+            names.append(name)
+        return names
+
+    @staticmethod
+    def codegen_validate_method(fields, optional_fields):
+        """
+        Generate code for a custom class's validate method, checking that a JSON object matches the schema
+        The schema is compiled into one check per field that returns False on the first mismatch: an unexpected key, a
+        missing or null field that was always present, or a value of a datatype never observed. Nested custom classes
+        are validated by their own validate methods; lists of primitives are checked to be lists, not element-wise.
+        :param fields: tree-like representation of custom class fields; dict with keys: fieldnames and values: datatypes
+        :param optional_fields: fieldnames that may be missing or null
+        :return: implementation for custom class's validate method
+        """
+        keys = 'frozenset({{{}}})'.format(', '.join(map(repr, fields))) if fields else 'frozenset()'
+        implementation = [UnimplementedType.VALIDATE_INIT.format(keys)]
+
+        for fieldname, dtype in fields.items():
+            if type(dtype) is UnimplementedType:
+                condition = '{} not {}.validate(value)'.format(
+                    'value is not None and' if fieldname in optional_fields else 'value is None or', dtype.classname)
+            else:
+                kinds = UnimplementedType.validated_kinds(dtype)
+                if kinds is None:
+                    # unknown or null datatype, any value is accepted
+                    continue
+                condition = 'type(value) is not {}'.format(kinds[0]) if len(kinds) == 1 \
+                    else 'type(value) not in ({})'.format(', '.join(kinds))
+                if fieldname in optional_fields:
+                    condition = 'value is not None and ' + condition
+
+            implementation.append(UnimplementedType.VALIDATE_VALUE.format(fieldname))
+            implementation.append(UnimplementedType.VALIDATE_CHECK.format(condition))
+            if type(dtype) is list and len(dtype) > 0 and type(dtype[0]) is UnimplementedType:
+                implementation.append(UnimplementedType.VALIDATE_LIST.format(dtype[0].classname))
+
+        implementation.append(UnimplementedType.VALIDATE_RETURN)
+        return ''.join(implementation)
+
+    @staticmethod
+    def validated_kinds(dtype):
+        """
+        Names of the Python types a JSON value of the given datatype may have, for use in generated validators
+        :param dtype: datatype other than UnimplementedType
+        :return: list of type names, or None if any value is accepted
+        """
+        kinds = []
+        for member in (dtype.members if type(dtype) is UnionType else (dtype,)):
+            if type(member) is UnknownType or member is NONE_TYPE:
+                if type(dtype) is not UnionType:
+                    return None
+                continue
+            kind = 'dict' if type(member) is UnimplementedType else 'list' if type(member) is list \
+                else 'str' if member is datetime else member.__name__
+            if kind not in kinds:
+                kinds.append(kind)
+        return kinds or None
+
+    def codegen(self, include_nested_classes=False, include_from_json_method=False, deduplicate_shapes=False,
+                slots=False, frozen=False, optimized=False, lazy=False, iterative=False, interned=False, typed=None,
+                instrumented=False, low_cardinality=None, include_columns_method=False, include_to_json_method=False,
+                include_validate_method=False, include_apply_patch_method=False, toplevel=True):
         """
         Generate code for custom class
         :param include_nested_classes: when True, will generate code for nested custom classes
         :param include_from_json_method: when True, will add from_json methods to generated code
+        :param deduplicate_shapes: when True, nested classes with identical shapes are generated once under the first
+            classname, see UnimplementedType.resolve_classnames
+        :param slots: when True, generated classes declare __slots__ and have no per-instance __dict__
+        :param frozen: when True, generated classes are immutable tuple subclasses with read-only field properties
+        :param optimized: when True, from_json methods dispatch to a from_dict method specialized to the schema's shape
+        :param lazy: when True, from_json keeps the raw JSON of nested custom class fields and decodes it on first access
+        :param iterative: when True, from_json decodes nested custom classes from an explicit stack instead of recursion
+        :param interned: when True, from_json shares instances of leaf classes with identical field values, and repeated
+            strings, through a bounded module-level cache; shared instances must be treated as immutable
+        :param typed: 'dataclass' or 'namedtuple' to generate dataclasses or NamedTuples with annotated fields, whose
+            from_json methods widen ints to floats for fields observed with both and parse fields recorded as datetime
+        :param instrumented: when True, the from_dict methods of optimized classes, or from_json methods otherwise,
+            count their calls and cumulative decode time, including the nested classes they decode, in the generated
+            module's decode_stats dict of classname: [calls, seconds]; cannot be combined with iterative
+        :param low_cardinality: 'enum' or 'constants' to generate, for string fields with few distinct values recorded
+            with track_values, a str Enum or module-level constants per field, which from_json maps values to so that
+            equal values are shared objects, see UnimplementedType.low_cardinality_values
+        :param include_columns_method: when True, will add from_json_columns methods decoding lists of JSON objects into
+            one column per field
+        :param include_to_json_method: when True, will add to_json and write_json methods serializing instances back to
+            JSON with the original field keys
+        :param include_validate_method: when True, will add validate methods checking whether a JSON object still
+            matches the schema
+        :param include_apply_patch_method: when True, will add apply_patch methods updating instances in place from a
+            partial JSON object or a list of JSON Patch style operations; requires include_from_json_method
+        :param toplevel: when False, the class is generated as part of an enclosing codegen call, which has already
+            resolved classnames and emitted import statements
         :return: implementation for custom class
         """
+        self.implementation = ''.join(self.iter_codegen(
+            include_nested_classes=include_nested_classes, include_from_json_method=include_from_json_method,
+            deduplicate_shapes=deduplicate_shapes, slots=slots, frozen=frozen, optimized=optimized, lazy=lazy,
+            iterative=iterative, interned=interned, typed=typed, instrumented=instrumented,
+            low_cardinality=low_cardinality, include_columns_method=include_columns_method,
+            include_to_json_method=include_to_json_method, include_validate_method=include_validate_method,
+            include_apply_patch_method=include_apply_patch_method,
+            toplevel=toplevel))
+        return self.implementation
+
+    def write_codegen(self, buf, **codegen_kwargs):
+        """
+        Write generated code to a file-like object chunk by chunk, without holding the whole module in memory
+        :param buf: file-like object opened for writing text
+        :param codegen_kwargs: keyword arguments of UnimplementedType.codegen
+        :return: number of characters written
+        """
+        written = 0
+        write = buf.write
+        for chunk in self.iter_codegen(**codegen_kwargs):
+            write(chunk)
+            written += len(chunk)
+        return written
+
+    def build_classes(self, include_from_json_method=True, deduplicate_shapes=False, cache=None, **codegen_kwargs):
+        """
+        Generate, compile and execute code for custom class and its nested classes, returning the live classes
+        Built classes are cached by classname, field name style, structural fingerprint and options, so building classes
+        for a shape seen before returns the same class objects without codegen, compilation or execution. As the
+        fingerprint ignores field order, classes built for a shape keep the constructor parameter order of the first
+        schema built with that shape. Classes are defined in a module registered in sys.modules under a name derived
+        from the cache key, until its entry is evicted.
+        :param include_from_json_method: when True, classes have from_json methods
+        :param deduplicate_shapes: see UnimplementedType.codegen
+        :param cache: CodeCache to use, defaults to UnimplementedType.code_cache
+        :param codegen_kwargs: further keyword arguments of UnimplementedType.codegen
+        :return: dict of classname to class, starting with this custom class
+        """
         if not self.is_serialized:
             raise NotSerializedError("No response JSON has been serialized")
 
-        self.implementation = ""
+        codegen_options = UnimplementedType.codegen_options(**codegen_kwargs)
+        if cache is None:
+            cache = UnimplementedType.code_cache
+
+        classname = UnimplementedType.snaked_to_camelcase(UnimplementedType.capitalize(self.classname))
+        key = (classname, self.style, self.fingerprint(), include_from_json_method, deduplicate_shapes,
+               tuple(sorted(codegen_options.items())))
+        if codegen_options['include_columns_method'] or codegen_options['include_validate_method']:
+            # columns are typed arrays, and validate methods accept nulls, only for fields according to whether they
+            # were ever missing, which the fingerprint does not capture
+            key += (tuple(tuple(sorted(node.optional_fields()))
+                          for node in [self, *UnimplementedType.iter_nested_classes(self.nested_classes, (classname,))]),)
+        if codegen_options['low_cardinality']:
+            # generated enums and constants depend on the tracked values, which the fingerprint does not capture
+            key += (repr([node.low_cardinality_values()
+                          for node in [self, *UnimplementedType.iter_nested_classes(self.nested_classes, (classname,))]]),)
 
+        cached = cache.get(key)
+        if cached is None:
+            classes = self.resolve_classnames(deduplicate_shapes)
+            header = UnimplementedType.codegen_header(include_from_json_method, **codegen_options)
+            implementation = ''.join(classes[0].iter_module_chunks(classes[1:], include_from_json_method, header,
+                                                             codegen_options))
+            module_name = 'built_{}_{}'.format(classname, hashlib.sha1(repr(key).encode('utf-8')).hexdigest()[:12])
+            # classes are executed in a registered module, so that dataclasses, typing.get_type_hints and pickle can
+            # find the module of generated classes
+            module = ModuleType(module_name)
+            sys.modules[module_name] = module
+            exec(compile(implementation, '<{}>'.format(module_name), 'exec'), module.__dict__)
+            cached = (module_name, {node.classname: getattr(module, node.classname) for node in classes})
+            evicted = cache.put(key, cached)
+            if evicted is not None:
+                # classes of the evicted entry are no longer importable by module name
+                sys.modules.pop(evicted[0], None)
+
+        return dict(cached[1])
+
+    def codegen_package(self, classes_per_module=1, include_from_json_method=False, deduplicate_shapes=False,
+                        **codegen_kwargs):
+        """
+        Generate code for custom class and its nested classes as a package with one submodule per group of classes
+        The package __init__ imports a submodule only when one of its classes is first accessed, via a module-level
+        __getattr__. Each submodule imports the classes it references from other submodules at its end, so that
+        mutually recursive classes import cleanly and importing a class loads only the classes reachable from it.
+        :param classes_per_module: number of classes per submodule, in the order classes are generated
+        :param include_from_json_method: when True, will add from_json methods to generated code
+        :param deduplicate_shapes: see UnimplementedType.codegen
+        :param codegen_kwargs: further keyword arguments of UnimplementedType.codegen
+        :return: dict of filename to file content, including __init__.py
+        """
+        if not self.is_serialized:
+            raise NotSerializedError("No response JSON has been serialized")
+        if classes_per_module < 1:
+            raise ValueError("classes_per_module must be positive")
+
+        codegen_options = UnimplementedType.codegen_options(**codegen_kwargs)
+        header = UnimplementedType.codegen_header(include_from_json_method, **codegen_options)
+        return UnimplementedType.package_files(
+            self.resolve_classnames(deduplicate_shapes), classes_per_module, header,
+            lambda node: ''.join(node.iter_class_chunks(include_from_json_method, **codegen_options)))
+
+    @staticmethod
+    def package_files(classes, classes_per_module, header, class_code):
+        """
+        Lay out generated classes as a package, see UnimplementedType.codegen_package
+        :param classes: list of UnimplementedTypes with resolved classnames, see UnimplementedType.resolve_classnames
+        :param classes_per_module: number of classes per submodule, in the order classes are generated
+        :param header: header of every submodule, see UnimplementedType.codegen_header
+        :param class_code: function returning the code of a class
+        :return: dict of filename to file content, including __init__.py
+        """
+        groups = [classes[i:i + classes_per_module] for i in range(0, len(classes), classes_per_module)]
+
+        # name each submodule after its first class, suffixed if the name is taken or is not a valid module name
+        modules, taken = {}, set()
+        for group in groups:
+            basename = UnimplementedType.camelcase_to_snaked(group[0].classname)
+            if keyword.iskeyword(basename):
+                basename += '_'
+            module, suffix = basename, 1
+            while module in taken:
+                suffix += 1
+                module = basename + str(suffix)
+            taken.add(module)
+            for node in group:
+                modules[node.classname] = module
+
+        files = {}
+        for group in groups:
+            module = modules[group[0].classname]
+            chunks = [header]
+            # classnames referenced from other submodules, in order of first reference
+            references = {}
+            for node in group:
+                chunks.append(class_code(node))
+                for dtype in node.nested_classes.values():
+                    if type(dtype) is list and len(dtype) > 0:
+                        dtype = dtype[0]
+                    if type(dtype) is UnimplementedType and modules[dtype.classname] != module:
+                        references[dtype.classname] = modules[dtype.classname]
+            chunks.extend(UnimplementedType.PACKAGE_IMPORT.format(references[classname], classname)
+                          for classname in references)
+            files[module + '.py'] = ''.join(chunks)
+
+        files['__init__.py'] = UnimplementedType.PACKAGE_INIT.format(
+            ', '.join(repr(node.classname) for node in classes),
+            ''.join(UnimplementedType.PACKAGE_MODULE_ENTRY.format(node.classname, '.' + modules[node.classname])
+                    for node in classes))
+        return files
+
+    def write_package(self, path, **package_kwargs):
+        """
+        Write the package generated by UnimplementedType.codegen_package to a directory
+        Files whose content is unchanged are not rewritten, so their cached bytecode stays valid.
+        :param path: package directory, created if it does not exist
+        :param package_kwargs: keyword arguments of UnimplementedType.codegen_package
+        :return: list of filenames written
+        """
+        os.makedirs(path, exist_ok=True)
+        return [filename for filename, content in self.codegen_package(**package_kwargs).items()
+                if UnimplementedType.write_if_changed(os.path.join(path, filename), content)]
+
+    @staticmethod
+    def write_if_changed(path, content):
+        """
+        Write a text file unless it already has the given content
+        :param path: file path
+        :param content: file content
+        :return: True if the file was written
+        """
+        if os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                if f.read() == content:
+                    return False
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(content)
+        return True
+
+    def iter_codegen(self, include_nested_classes=False, include_from_json_method=False, deduplicate_shapes=False,
+                     slots=False, frozen=False, optimized=False, lazy=False, iterative=False, interned=False,
+                     typed=None, instrumented=False, low_cardinality=None, include_columns_method=False,
+                     include_to_json_method=False, include_validate_method=False, include_apply_patch_method=False,
+                     toplevel=True):
+        """
+        Generate code for custom class as an iterator of string chunks, see UnimplementedType.codegen for parameters
+        Options are validated and classnames resolved when called; classes are then generated one at a time as the
+        chunks are consumed, so memory use is bounded by the largest class rather than by the whole module.
+        :return: iterator of chunks of the implementation for custom class
+        """
+        if not self.is_serialized:
+            raise NotSerializedError("No response JSON has been serialized")
+
+        codegen_options = UnimplementedType.codegen_options(
+            slots=slots, frozen=frozen, optimized=optimized, lazy=lazy, iterative=iterative, interned=interned,
+            typed=typed, instrumented=instrumented, low_cardinality=low_cardinality,
+            include_columns_method=include_columns_method,
+            include_to_json_method=include_to_json_method, include_validate_method=include_validate_method,
+            include_apply_patch_method=include_apply_patch_method)
+
+        if toplevel:
+            root, *nested = self.resolve_classnames(deduplicate_shapes)
+        else:
+            root, nested = self, UnimplementedType.iter_nested_classes(self.nested_classes, (self.classname,))
+        header = UnimplementedType.codegen_header(include_from_json_method, **codegen_options) if toplevel else ''
+        return root.iter_module_chunks(nested if include_nested_classes else (), include_from_json_method, header,
+                                       codegen_options)
+
+    @staticmethod
+    def codegen_options(slots=False, frozen=False, optimized=False, lazy=False, iterative=False, interned=False,
+                        typed=None, instrumented=False, low_cardinality=None, include_columns_method=False,
+                        include_to_json_method=False, include_validate_method=False, include_apply_patch_method=False):
+        """
+        Validate the options shared by every generated class, see UnimplementedType.codegen
+        :return: dict of options, forwarded to nested classes
+        """
+        if lazy and (slots or frozen):
+            raise ValueError("lazy decoding caches values in the instance __dict__ and cannot be combined with slots "
+                             "or frozen")
+        if iterative and (frozen or lazy or optimized):
+            raise ValueError("iterative decoding assigns fields after instantiation and cannot be combined with "
+                             "frozen, lazy or optimized")
+        if interned and (lazy or iterative):
+            raise ValueError("interning shares instances constructed from their field values and cannot be combined "
+                             "with lazy or iterative")
+        if typed not in (None, 'dataclass', 'namedtuple'):
+            raise ValueError("typed must be None, 'dataclass' or 'namedtuple'")
+        if typed and (lazy or iterative):
+            raise ValueError("typed classes are constructed from converted field values and cannot be combined with "
+                             "lazy or iterative")
+        if typed == 'namedtuple' and (slots or frozen):
+            raise ValueError("namedtuple classes are immutable tuples and cannot be combined with slots or frozen")
+        if low_cardinality not in (None, 'enum', 'constants'):
+            raise ValueError("low_cardinality must be None, 'enum' or 'constants'")
+        if low_cardinality and (lazy or iterative):
+            raise ValueError("low_cardinality maps field values in the constructor call of from_json and cannot be "
+                             "combined with lazy or iterative")
+        if instrumented and iterative:
+            raise ValueError("instrumented wraps the decoding method of each class, which iterative decoding does not "
+                             "call for nested classes")
+        if include_apply_patch_method and (frozen or interned or typed == 'namedtuple'):
+            raise ValueError("apply_patch updates instances in place and cannot be combined with frozen, interned or "
+                             "namedtuple classes")
+
+        return {
+            'slots': slots, 'frozen': frozen, 'optimized': optimized, 'lazy': lazy, 'iterative': iterative,
+            'interned': interned, 'typed': typed, 'instrumented': instrumented, 'low_cardinality': low_cardinality,
+            'include_columns_method': include_columns_method,
+            'include_to_json_method': include_to_json_method, 'include_validate_method': include_validate_method,
+            'include_apply_patch_method': include_apply_patch_method,
+        }
+
+    def iter_module_chunks(self, nested, include_from_json_method, header, codegen_options):
+        """
+        Generate the chunks of the module header, this class and the given nested classes
+        For use in UnimplementedType.iter_codegen after options have been validated and classnames resolved.
+        :param nested: iterable of nested UnimplementedTypes to generate after this class
+        :param include_from_json_method: when True, will add from_json methods to generated code
+        :param header: module header to start with, see UnimplementedType.codegen_header
+        :param codegen_options: dict of options shared by every class, see UnimplementedType.codegen_options
+        :return: generator of string chunks
+        """
+        if header:
+            yield header
+
+        instrumentation = UnimplementedType.instrumentation
+        for node in chain((self,), nested):
+            chunks = node.iter_class_chunks(include_from_json_method, **codegen_options)
+            if instrumentation is not None:
+                chunks = instrumentation.timed_class(node.classname, chunks)
+            yield from chunks
+
+    def iter_class_chunks(self, include_from_json_method=False, slots=False, frozen=False, optimized=False, lazy=False,
+                          iterative=False, interned=False, typed=None, instrumented=False, low_cardinality=None,
+                          include_columns_method=False,
+                          include_to_json_method=False, include_validate_method=False,
+                          include_apply_patch_method=False):
+        """
+        Generate the code of this class alone, without nested classes, as string chunks
+        :param include_from_json_method: when True, will add from_json methods to generated code
+        :param slots: see UnimplementedType.codegen
+        :param frozen: see UnimplementedType.codegen
+        :param optimized: see UnimplementedType.codegen
+        :param lazy: see UnimplementedType.codegen
+        :param iterative: see UnimplementedType.codegen
+        :param interned: see UnimplementedType.codegen
+        :param typed: see UnimplementedType.codegen
+        :param instrumented: see UnimplementedType.codegen
+        :param low_cardinality: see UnimplementedType.codegen
+        :param include_columns_method: see UnimplementedType.codegen
+        :param include_to_json_method: see UnimplementedType.codegen
+        :param include_validate_method: see UnimplementedType.codegen
+        :param include_apply_patch_method: see UnimplementedType.codegen
+        :return: generator of string chunks
+        """
         # populate list of fieldnames, datatypes, and default constructor parameters
         fieldnames, dtypes, defaults = [], [], []
+        attributes = self.attribute_index(namedtuple=typed == 'namedtuple')
         for fieldname, dtype in self.nested_classes.items():
-            if self.style == 'underscore':
-                fieldname = UnimplementedType.camelcase_to_snaked(fieldname)
-            else:
-                fieldname = UnimplementedType.snaked_to_camelcase(fieldname)
+            fieldname = attributes[fieldname]
             fieldnames.append(fieldname)
             dtypes.append(dtype)
             defaults.append([] if type(dtype) is list else None)
 
-        classname_uppercase = UnimplementedType.capitalize(self.classname)
-        self.classname = UnimplementedType.snaked_to_camelcase(classname_uppercase)
-        # add class declaration to implementation
-        self.implementation += UnimplementedType.CLASS_HEADER.format(self.classname)
         # create string with parameters for constructor for custom classes
         parameters = ', '.join([UnimplementedType.CLASS_PARAMETER.format(fieldname, default)
                                 for fieldname, default in zip(fieldnames, defaults)])
-        # create string with constructor assignments
-        assignments = '\n'.join([UnimplementedType.CLASS_ASSIGNMENT.format(fieldname, fieldname)
-                                 for fieldname in fieldnames])
-        # add constructor to implementation
-        self.implementation += UnimplementedType.CLASS_INIT.format(parameters, assignments)
+
+        canonical = {}
+        if low_cardinality:
+            # add Enum classes or constants, and the dicts mapping field values to them, ahead of the class
+            implementation, canonical = self.codegen_canonical_values(attributes, low_cardinality)
+            if implementation:
+                yield implementation
+
+        if instrumented:
+            # wrap from_json once the class is defined
+            yield UnimplementedType.INSTRUMENT_DECORATOR
+
+        if typed:
+            # add dataclass or NamedTuple declaration with an annotated field per attribute
+            if typed == 'namedtuple':
+                yield UnimplementedType.TYPED_NAMEDTUPLE.format(self.classname)
+            else:
+                arguments = [argument for argument, enabled in (('frozen=True', frozen), ('slots=True', slots))
+                             if enabled]
+                yield UnimplementedType.TYPED_DATACLASS.format(
+                    '({})'.format(', '.join(arguments)) if arguments else '', self.classname)
+            yield '\n'.join([UnimplementedType.codegen_typed_field(fieldname, dtype, typed)
+                             for fieldname, dtype in zip(fieldnames, dtypes)])
+        elif frozen:
+            # add tuple subclass declaration with empty slots, so instances carry only their tuple items
+            yield UnimplementedType.CLASS_HEADER_BASE.format(self.classname, 'tuple')
+            yield UnimplementedType.CLASS_SLOTS.format('()')
+            # add constructor packing parameters into the tuple, followed by a read-only property per field
+            yield UnimplementedType.CLASS_TUPLE_NEW.format(parameters, UnimplementedType.tuple_literal(fieldnames))
+            yield '\n'.join([UnimplementedType.CLASS_TUPLE_PROPERTY.format(fieldname, i)
+                             for i, fieldname in enumerate(fieldnames)])
+        else:
+            # add class declaration to implementation
+            yield UnimplementedType.CLASS_HEADER.format(self.classname)
+            if slots:
+                yield UnimplementedType.CLASS_SLOTS.format(
+                    UnimplementedType.tuple_literal([repr(fieldname) for fieldname in fieldnames]))
+            # create string with constructor assignments
+            assignments = '\n'.join([UnimplementedType.CLASS_ASSIGNMENT.format(fieldname, fieldname)
+                                     for fieldname in fieldnames])
+            # add constructor to implementation
+            yield UnimplementedType.CLASS_INIT.format(parameters, assignments)
 
         if include_from_json_method:
-            self.implementation += '\n\n'
+            yield '\n\n'
             # add from_json method to implementation
-            self.implementation += UnimplementedType.codegen_from_json_method(self.classname, self.nested_classes)
+            if lazy:
+                yield UnimplementedType.codegen_lazy_from_json_method(
+                    self.classname, self.nested_classes, attributes, optimized=optimized)
+                properties = UnimplementedType.codegen_lazy_properties(self.nested_classes, attributes)
+                if properties:
+                    yield '\n\n' + properties
+            elif iterative:
+                yield UnimplementedType.codegen_iterative_from_json_method(
+                    self.classname, self.nested_classes, attributes)
+            elif optimized:
+                # nested leaf classes are constructed in place unless their from_dict transforms field values or
+                # is instrumented
+                yield UnimplementedType.codegen_optimized_from_json_method(
+                    self.classname, self.nested_classes, attributes, interned, typed, canonical,
+                    inline_leaves=not (interned or typed or instrumented or low_cardinality))
+            else:
+                yield UnimplementedType.codegen_from_json_method(self.classname, self.nested_classes, attributes,
+                                                                 interned, typed, canonical)
 
-        self.implementation += '\n\n\n'
+        if include_columns_method:
+            yield '\n\n'
+            # add from_json_columns method to implementation
+            yield UnimplementedType.codegen_columns_method(self.nested_classes, attributes, self.optional_fields())
 
-        if include_nested_classes:
-            self.implementation += ''.join([impl for impl in UnimplementedType.codegen_nested_classes(
-                self.nested_classes, include_from_json_method=include_from_json_method)])
+        if include_to_json_method:
+            yield '\n\n'
+            # add to_json and write_json methods to implementation
+            yield UnimplementedType.codegen_to_json_method(self.nested_classes, attributes, typed)
+            yield '\n\n'
+            yield UnimplementedType.codegen_write_json_method(self.nested_classes, attributes, typed)
 
-        return self.implementation
+        if include_validate_method:
+            yield '\n\n'
+            # add validate method to implementation
+            yield UnimplementedType.codegen_validate_method(self.nested_classes, self.optional_fields())
+
+        if include_apply_patch_method:
+            yield '\n\n'
+            # add apply_patch and _patch_child methods to implementation
+            yield UnimplementedType.codegen_apply_patch_method(self.nested_classes, attributes, typed, canonical)
+
+        yield '\n\n\n'
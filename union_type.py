@@ -0,0 +1,29 @@
+class UnionType:
+    """
+    Object to represent a field observed with more than one incompatible datatype across samples
+    """
+    def __init__(self, members):
+        """
+        :param members: iterable of datatypes observed for the field, in order of first observation
+        """
+        self.members = ()
+        for member in members:
+            self.add(member)
+
+    def add(self, member):
+        """
+        Add a datatype to the union, ignoring datatypes that are already members
+        :param member: datatype to add, may itself be a UnionType
+        :return: self
+        """
+        for dtype in (member.members if type(member) is UnionType else (member,)):
+            if dtype not in self.members:
+                self.members += (dtype,)
+        return self
+
+    def __eq__(self, other):
+        return type(other) is UnionType and len(self.members) == len(other.members) \
+            and all(member in other.members for member in self.members)
+
+    def __repr__(self):
+        return "<Union {}>".format(' | '.join(getattr(member, '__name__', repr(member)) for member in self.members))